@@ -1,13 +1,14 @@
 from django.contrib import admin
-from .models import FaceData, AttendanceSession, AttendanceRecord
+from .models import FaceData, AttendanceSession, AttendanceRecord, AttendanceSummary
 
 @admin.register(FaceData)
 class FaceDataAdmin(admin.ModelAdmin):
-    list_display = ('student', 'has_encoding')
+    list_display = ('student', 'status', 'has_encoding', 'updated_at')
+    list_filter = ('status',)
     search_fields = ('student__user__first_name', 'student__enrollment_number')
     
     def has_encoding(self, obj):
-        return bool(obj.encoding_json)
+        return bool(obj.encoding)
     has_encoding.boolean = True
 
 class AttendanceRecordInline(admin.TabularInline):
@@ -20,4 +21,11 @@ class AttendanceRecordInline(admin.TabularInline):
 class AttendanceSessionAdmin(admin.ModelAdmin):
     list_display = ('subject', 'date', 'status')
     list_filter = ('date', 'subject')
-    inlines = [AttendanceRecordInline] # View all students for this session directly
\ No newline at end of file
+    inlines = [AttendanceRecordInline] # View all students for this session directly
+
+@admin.register(AttendanceSummary)
+class AttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'subject', 'sessions_held', 'present', 'absent', 'max_absent_streak', 'last_updated')
+    list_filter = ('subject',)
+    search_fields = ('student__enrollment_number', 'student__user__first_name')
+    readonly_fields = ('sessions_held', 'present', 'absent', 'current_streak', 'max_absent_streak', 'last_updated')
@@ -0,0 +1,256 @@
+"""
+IVF-style approximate nearest-neighbour index for large face galleries.
+
+Vectors are bucketed by their nearest coarse centroid (k-means). A query is
+compared only against the vectors in its `nprobe` closest buckets, so the
+cost grows with roughly sqrt(N) instead of N. Below MIN_TRAIN_SIZE the index
+stays flat and searches exhaustively.
+
+The index is persisted as plain .npy files (loadable with mmap) plus an
+append-only log of adds/removes, so registrations update it incrementally
+and workers only replay the new log records.
+"""
+import os
+import struct
+
+import numpy as np
+
+from apps.attendance.matcher import ENCODING_DIM
+
+MIN_TRAIN_SIZE = 1024
+RETRAIN_GROWTH = 4
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE_PER_LIST = 64
+DEFAULT_NPROBE = 8
+SEARCH_CHUNK = 4096
+
+OP_REMOVE, OP_ADD = 0, 1
+LOG_RECORD = struct.Struct(f'<bq{ENCODING_DIM}f')
+LOG_FILE = 'changes.log'
+
+
+def _sq_distances(a, b, b_sq=None):
+    if b_sq is None:
+        b_sq = np.einsum('ij,ij->i', b, b)
+    a_sq = np.einsum('ij,ij->i', a, a)
+    d2 = a_sq[:, None] + b_sq[None, :] - 2.0 * (a @ b.T)
+    return np.maximum(d2, 0.0, out=d2)
+
+
+def _nearest_centroid(vectors, centroids):
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_CHUNK):
+        chunk = vectors[start:start + SEARCH_CHUNK]
+        assign[start:start + len(chunk)] = _sq_distances(chunk, centroids, c_sq).argmin(axis=1)
+    return assign
+
+
+def kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Plain Lloyd's k-means on a random sample; returns (k, dim) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, k * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[rng.choice(n, sample_size, replace=False)], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+    return centroids
+
+
+class FaceIndex:
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        self._positions = {}
+        self._lists = None
+        self._sq_norms = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -- building ------------------------------------------------------------------
+
+    def add(self, ids, vectors):
+        """Add or replace vectors; retrains once the gallery has grown enough."""
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if not len(ids):
+            return
+        if len(np.unique(ids)) != len(ids):
+            # Keep the last vector for repeated IDs, as sequential adds would.
+            _, last = np.unique(ids[::-1], return_index=True)
+            keep = np.sort(len(ids) - 1 - last)
+            ids, vectors = ids[keep], vectors[keep]
+        self.remove([i for i in ids.tolist() if i in self._positions])
+
+        start = len(self.ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.vectors = np.concatenate([self.vectors, vectors])
+        if self.centroids is not None:
+            self.assign = np.concatenate([self.assign, _nearest_centroid(vectors, self.centroids)])
+        self._positions.update((int(i), start + n) for n, i in enumerate(ids.tolist()))
+        self._invalidate()
+
+        if self._needs_training():
+            self.train()
+
+    def remove(self, ids):
+        rows = [self._positions[i] for i in ids if i in self._positions]
+        if not rows:
+            return
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[rows] = False
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        if self.centroids is not None:
+            self.assign = self.assign[keep]
+        self._positions = {int(i): n for n, i in enumerate(self.ids.tolist())}
+        self._invalidate()
+
+    def train(self, seed=0):
+        n = len(self.ids)
+        if n < MIN_TRAIN_SIZE:
+            self.centroids = None
+            self.assign = np.empty(0, dtype=np.int32)
+            self.trained_size = 0
+        else:
+            nlist = max(1, int(np.sqrt(n)))
+            self.centroids = kmeans(self.vectors, nlist, seed=seed)
+            self.assign = _nearest_centroid(self.vectors, self.centroids)
+            self.trained_size = n
+        self._invalidate()
+
+    def _needs_training(self):
+        n = len(self.ids)
+        if n < MIN_TRAIN_SIZE:
+            return False
+        return self.centroids is None or n >= RETRAIN_GROWTH * self.trained_size
+
+    def _invalidate(self):
+        self._lists = None
+        self._sq_norms = None
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assign, kind='stable')
+            bounds = np.searchsorted(self.assign[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    # -- querying ------------------------------------------------------------------
+
+    def search(self, queries, k=1, threshold=None, nprobe=DEFAULT_NPROBE):
+        """
+        k nearest neighbours for each query, nearest first.
+        Returns one list of (id, distance) per query, dropping neighbours
+        farther than `threshold` when it is given.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        results = [[] for _ in range(len(queries))]
+        if not len(self.ids) or not len(queries):
+            return results
+        if self._sq_norms is None:
+            self._sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+        if self.centroids is None:
+            probes = None
+        else:
+            lists = self._inverted_lists()
+            nprobe = min(nprobe, len(self.centroids))
+            cd = _sq_distances(queries, self.centroids)
+            probes = np.argpartition(cd, nprobe - 1, axis=1)[:, :nprobe]
+
+        for qi, query in enumerate(queries):
+            if probes is None:
+                rows = None
+                d2 = _sq_distances(query[None, :], self.vectors, self._sq_norms)[0]
+            else:
+                rows = np.concatenate([lists[p] for p in probes[qi]])
+                if not len(rows):
+                    continue
+                d2 = _sq_distances(query[None, :], self.vectors[rows], self._sq_norms[rows])[0]
+
+            kk = min(k, len(d2))
+            top = np.argpartition(d2, kk - 1)[:kk]
+            top = top[np.argsort(d2[top])]
+            for j in top:
+                distance = float(np.sqrt(d2[j]))
+                if threshold is not None and distance > threshold:
+                    break
+                row = j if rows is None else rows[j]
+                results[qi].append((int(self.ids[row]), distance))
+        return results
+
+    # -- persistence ---------------------------------------------------------------
+
+    def save(self, directory):
+        """Write a snapshot atomically (each file is replaced in one rename)."""
+        os.makedirs(directory, exist_ok=True)
+        centroids = self.centroids if self.centroids is not None else np.empty((0, ENCODING_DIM), np.float32)
+        arrays = {
+            'ids': self.ids,
+            'vectors': self.vectors,
+            'centroids': centroids,
+            'assign': self.assign,
+            'meta': np.array([self.trained_size], dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            tmp = os.path.join(directory, f'{name}.tmp.npy')
+            np.save(tmp, array)
+            os.replace(tmp, os.path.join(directory, f'{name}.npy'))
+
+    @classmethod
+    def load(cls, directory):
+        index = cls()
+        if not os.path.exists(os.path.join(directory, 'ids.npy')):
+            return index
+        index.ids = np.load(os.path.join(directory, 'ids.npy'))
+        index.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        centroids = np.load(os.path.join(directory, 'centroids.npy'))
+        index.trained_size = int(np.load(os.path.join(directory, 'meta.npy'))[0])
+        if len(centroids):
+            index.centroids = centroids
+            index.assign = np.load(os.path.join(directory, 'assign.npy'))
+        index._positions = {int(i): n for n, i in enumerate(index.ids.tolist())}
+        return index
+
+    def apply_log(self, path, offset=0):
+        """Replay log records written after `offset`; returns the new offset."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        usable = len(data) - len(data) % LOG_RECORD.size
+
+        # Only the last change per ID matters, so replay as one remove + one add.
+        latest = {}
+        for op, face_id, *vector in LOG_RECORD.iter_unpack(data[:usable]):
+            latest[face_id] = (op, vector)
+        self.remove([i for i, (op, _) in latest.items() if op == OP_REMOVE])
+        added = [(i, vector) for i, (op, vector) in latest.items() if op == OP_ADD]
+        if added:
+            ids, vectors = zip(*added)
+            self.add(ids, np.array(vectors, dtype=np.float32))
+        return offset + usable
+
+
+def append_log(path, op, face_id, vector=None):
+    if vector is None:
+        vector = np.zeros(ENCODING_DIM, dtype=np.float32)
+    with open(path, 'ab') as f:
+        f.write(LOG_RECORD.pack(op, face_id, *np.asarray(vector, dtype=np.float32).tolist()))
@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from filelock import FileLock
+
+from apps.attendance.ann import FaceIndex, append_log, OP_ADD, OP_REMOVE, LOG_FILE, LOG_RECORD
+from apps.attendance.matcher import DEFAULT_TOLERANCE, ENCODING_DIM
+from apps.attendance.models import FaceData, ENCODING_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Campus-wide index over every registered student, keyed by student ID. Each
+# process keeps one loaded copy and replays the shared change log on access.
+_state = {'index': None, 'snapshot_mtime': None, 'log_offset': 0}
+_lock = threading.Lock()
+
+
+def _paths():
+    directory = str(settings.FACE_INDEX_DIR)
+    return directory, os.path.join(directory, LOG_FILE), os.path.join(directory, 'index.lock')
+
+
+def _snapshot_mtime(directory):
+    try:
+        return os.stat(os.path.join(directory, 'ids.npy')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _log_size(log_path):
+    try:
+        return os.path.getsize(log_path)
+    except FileNotFoundError:
+        return 0
+
+
+def get_campus_index():
+    directory, log_path, lock_path = _paths()
+    with _lock:
+        mtime = _snapshot_mtime(directory)
+        stale = (
+            _state['index'] is None
+            or mtime != _state['snapshot_mtime']
+            or _log_size(log_path) < _state['log_offset']  # log was compacted
+        )
+        if stale:
+            os.makedirs(directory, exist_ok=True)
+            with FileLock(lock_path):
+                _state['index'] = FaceIndex.load(directory)
+                _state['snapshot_mtime'] = _snapshot_mtime(directory)
+                _state['log_offset'] = 0
+        _state['log_offset'] = _state['index'].apply_log(log_path, _state['log_offset'])
+        return _state['index']
+
+
+def record_face_change(student_id, encoding=None):
+    """Append an add (encoding given) or remove to the shared change log."""
+    record_face_changes([(student_id, encoding)])
+
+
+def record_face_changes(changes):
+    """
+    Append (student_id, encoding or None) changes under one lock, and fold
+    the log into a new snapshot once it passes FACE_INDEX_COMPACT_AFTER
+    records, so it never grows without bound and loads replay little.
+    """
+    if not changes:
+        return
+    directory, log_path, lock_path = _paths()
+    os.makedirs(directory, exist_ok=True)
+    with FileLock(lock_path):
+        for student_id, encoding in changes:
+            if encoding is None:
+                append_log(log_path, OP_REMOVE, student_id)
+            else:
+                append_log(log_path, OP_ADD, student_id, encoding)
+        if _log_size(log_path) >= settings.FACE_INDEX_COMPACT_AFTER * LOG_RECORD.size:
+            _compact(directory, log_path)
+
+
+def _compact(directory, log_path):
+    # Caller holds the index lock. Snapshot + log is the current index, so no DB read is needed.
+    index = FaceIndex.load(directory)
+    index.apply_log(log_path)
+    index.save(directory)
+    open(log_path, 'wb').close()
+    logger.info(f"Compacted campus face index change log ({len(index)} students)")
+
+
+def rebuild_campus_index():
+    """Build a fresh snapshot from every FaceData row and compact the log."""
+    directory, log_path, lock_path = _paths()
+    os.makedirs(directory, exist_ok=True)
+    with FileLock(lock_path):
+        student_ids, blobs = [], []
+        rows = FaceData.objects.filter(encoding__isnull=False).values_list('student_id', 'encoding')
+        for student_id, blob in rows.iterator(chunk_size=2000):
+            if len(blob) == ENCODING_BYTES:
+                student_ids.append(student_id)
+                blobs.append(blob)
+
+        index = FaceIndex()
+        index.add(student_ids, np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(-1, ENCODING_DIM))
+        index.train()
+        index.save(directory)
+        open(log_path, 'wb').close()
+    logger.info(f"Rebuilt campus face index with {len(index)} students")
+    return index
+
+
+def identify_faces(encodings, k=1, threshold=DEFAULT_TOLERANCE, nprobe=None):
+    """k nearest registered students per face as (student_id, distance) lists."""
+    return get_campus_index().search(
+        encodings, k=k, threshold=threshold, nprobe=nprobe or settings.FACE_INDEX_NPROBE,
+    )
@@ -0,0 +1,105 @@
+import io
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+STATE_TIMEOUT = 60 * 60 * 2
+HITS_KEY = 'face_dedup_hits'
+MISSES_KEY = 'face_dedup_misses'
+
+
+def frame_hash(data):
+    """64-bit difference hash of a tiny grayscale copy of the frame."""
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', ((HASH_SIZE + 1) * 4, HASH_SIZE * 4))
+    image = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _state_key(session_id, source=''):
+    # One state per capture device: frames from two cameras never look alike.
+    return f"face_frame_{session_id}_{source}" if source else f"face_frame_{session_id}"
+
+
+def _incr(key, delta):
+    if delta <= 0:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def split_duplicates(session_id, frames, source=''):
+    """
+    Drop frames that are near-identical to the last recognised frame from
+    the same device in the session (or to an earlier frame in the batch).
+    Returns (fresh, previous): fresh is a list of (hash, data) still needing
+    recognition, previous is the stored result of the last recognised frame.
+    """
+    threshold = settings.FACE_FRAME_DEDUP_THRESHOLD
+    if threshold < 0:
+        return [(None, data) for data in frames], None
+
+    previous = cache.get(_state_key(session_id, source))
+    if previous is not None and time.time() - previous['at'] > settings.FACE_FRAME_DEDUP_MAX_AGE:
+        previous = None
+
+    seen = [previous['hash']] if previous is not None else []
+    fresh = []
+    hits = 0
+    for data in frames:
+        try:
+            h = frame_hash(data)
+        except (OSError, ValueError):
+            fresh.append((None, data))
+            continue
+        if any(hamming(h, s) <= threshold for s in seen):
+            hits += 1
+            continue
+        seen.append(h)
+        fresh.append((h, data))
+
+    _incr(HITS_KEY, hits)
+    _incr(MISSES_KEY, len(fresh))
+    return fresh, previous
+
+
+def remember_result(session_id, frame_hash_value, matches, source=''):
+    if frame_hash_value is None or settings.FACE_FRAME_DEDUP_THRESHOLD < 0:
+        return
+    cache.set(
+        _state_key(session_id, source),
+        {'hash': frame_hash_value, 'at': time.time(), 'matches': [(m.student_id, m.name) for m in matches]},
+        timeout=STATE_TIMEOUT,
+    )
+
+
+def clear_session_state(session_id, sources=()):
+    cache.delete_many([_state_key(session_id)] + [_state_key(session_id, source) for source in sources])
+
+
+def get_dedup_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0.0,
+        'threshold': settings.FACE_FRAME_DEDUP_THRESHOLD,
+    }
@@ -0,0 +1,237 @@
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EncoderBusy(Exception):
+    """The encoding queue is full; the caller should retry later."""
+
+
+class EncoderTimeout(Exception):
+    """The encoding did not finish within FACE_ENCODER_TIMEOUT."""
+
+
+DEFAULT_PIPELINE_OPTIONS = {
+    'model': 'hog',
+    'upsample': 1,
+    'detect_max_dim': 640,
+    'encode_max_dim': 1280,
+}
+
+
+# --- Runs inside the pool processes -------------------------------------------------
+
+def _warm_up():
+    import face_recognition  # noqa: F401  (loads the dlib models once per process)
+
+
+def _load_image(data, max_dim):
+    """
+    Decode to RGB no larger than max_dim on the long side. JPEG draft mode
+    lets libjpeg decode straight at 1/2, 1/4 or 1/8 scale, so a phone photo
+    never gets decoded at full resolution.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    if max_dim:
+        image.draft('RGB', (max_dim, max_dim))
+    image = image.convert('RGB')
+    if max_dim and max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim))
+    return image
+
+
+def _lap(timings, stage, started):
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started) * 1000
+    return now
+
+
+def encode_image(data, options=None, timings=None):
+    """
+    Detect every face in an encoded image and return their float32 encodings.
+    Detection runs on a small copy of the frame; the boxes are scaled back up
+    and the 128-d encodings are computed on the larger encode image.
+    Stage durations (ms) are added to `timings` when a dict is given.
+    """
+    import face_recognition
+
+    started = time.perf_counter()
+    opts = dict(DEFAULT_PIPELINE_OPTIONS, **(options or {}))
+    encode_img = _load_image(data, opts['encode_max_dim'])
+    detect_img = encode_img
+    if opts['detect_max_dim'] and max(encode_img.size) > opts['detect_max_dim']:
+        detect_img = encode_img.copy()
+        detect_img.thumbnail((opts['detect_max_dim'], opts['detect_max_dim']))
+    started = _lap(timings, 'decode', started)
+
+    locations = face_recognition.face_locations(
+        np.asarray(detect_img),
+        number_of_times_to_upsample=opts['upsample'],
+        model=opts['model'],
+    )
+    started = _lap(timings, 'detect', started)
+    if not locations:
+        return []
+
+    width, height = encode_img.size
+    sx = width / detect_img.size[0]
+    sy = height / detect_img.size[1]
+    scaled = [
+        (
+            max(0, int(top * sy)),
+            min(width, int(round(right * sx))),
+            min(height, int(round(bottom * sy))),
+            max(0, int(left * sx)),
+        )
+        for top, right, bottom, left in locations
+    ]
+    encodings = face_recognition.face_encodings(np.asarray(encode_img), known_face_locations=scaled)
+    _lap(timings, 'encode', started)
+    return [np.asarray(e, dtype=np.float32) for e in encodings]
+
+
+def encode_image_timed(data, options=None):
+    """encode_image that also returns its stage timings, for callers in another process."""
+    timings = {}
+    return encode_image(data, options, timings), timings
+
+
+def encode_images_timed(frames, options=None):
+    """Encode several frames in one pool task; returns (encodings per frame, summed stage timings)."""
+    timings = {}
+    return [encode_image(data, options, timings) for data in frames], timings
+
+
+def encode_reference_file(task):
+    """
+    Encode one stored reference photo for bulk re-encoding.
+    task is (face_data_id, path, options); returns (face_data_id, float32
+    bytes or None, error message, stage timings). Never raises, so one bad
+    file cannot stop a pool.map over thousands of images.
+    """
+    face_data_id, path, options = task
+    timings = {}
+    try:
+        with open(path, 'rb') as f:
+            encodings = encode_image(f.read(), options, timings)
+    except Exception as e:
+        return face_data_id, None, f"{type(e).__name__}: {e}", timings
+    if not encodings:
+        return face_data_id, None, 'No face detected', timings
+    if len(encodings) > 1:
+        return face_data_id, None, f'{len(encodings)} faces detected', timings
+    return face_data_id, encodings[0].tobytes(), '', timings
+
+
+# --- Runs in the web workers --------------------------------------------------------
+
+_executor = None
+_slots = None
+_background_executor = None
+_lock = threading.Lock()
+
+
+def _new_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_warm_up,
+    )
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = settings.FACE_ENCODER_WORKERS
+                # Frames being encoded plus frames allowed to wait for a free process.
+                _slots = threading.BoundedSemaphore(workers + settings.FACE_ENCODER_QUEUE_SIZE)
+                _executor = _new_pool(workers)
+                logger.info(f"Started face encoder pool with {workers} processes")
+    return _executor, _slots
+
+
+def pipeline_options():
+    """Pre-processing settings passed to encode_image in the pool processes."""
+    return {
+        'model': settings.FACE_DETECTION_MODEL,
+        'upsample': settings.FACE_DETECTION_UPSAMPLE,
+        'detect_max_dim': settings.FACE_DETECT_MAX_DIM,
+        'encode_max_dim': settings.FACE_ENCODE_MAX_DIM,
+    }
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def run_encoder(fn, *args):
+    """
+    Run fn(*args) in the face encoder pool and wait for the result.
+    Raises EncoderBusy straight away when the bounded queue is full, and
+    EncoderTimeout when the result takes longer than FACE_ENCODER_TIMEOUT.
+    With FACE_ENCODER_WORKERS = 0 the call runs inline (development).
+    """
+    if settings.FACE_ENCODER_WORKERS <= 0:
+        return fn(*args)
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise EncoderBusy()
+
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _reset_executor()
+        raise
+    # The slot is held until the process finishes, even if we stop waiting.
+    future.add_done_callback(lambda _f: slots.release())
+
+    try:
+        return future.result(timeout=settings.FACE_ENCODER_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise EncoderTimeout()
+    except BrokenProcessPool:
+        logger.error("Face encoder pool crashed; it will be restarted on the next request")
+        _reset_executor()
+        raise
+
+
+def submit_background(fn, *args):
+    """
+    Queue fn(*args) on a separate, unbounded background pool and return the
+    Future. Used for work nobody is waiting on (deferred registrations), so
+    it never takes a slot from live recognition.
+    """
+    global _background_executor
+    with _lock:
+        if _background_executor is None:
+            workers = max(1, settings.FACE_REGISTRATION_WORKERS)
+            _background_executor = _new_pool(workers)
+            logger.info(f"Started background face encoder pool with {workers} processes")
+        executor = _background_executor
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        with _lock:
+            _background_executor = None
+        raise
@@ -0,0 +1,132 @@
+"""
+Attendance register exports.
+
+A register is one row per student and one column per session (P, A, or
+blank when the student has no record), followed by per-student totals and a
+footer with the number present at each session. Rows are generated as the
+response is sent: only the session columns are held in memory, students are
+read with a chunked iterator, and records are fetched one block of students
+at a time, so memory stays flat however many students and sessions there are.
+"""
+import csv
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+
+from apps.students.models import Student
+from apps.attendance.models import AttendanceRecord, AttendanceSession
+
+STUDENT_BLOCK = 200  # Students per records query
+CHUNK_SIZE = 2000
+TOTAL_COLUMNS = ['Present', 'Absent', 'Attendance %']
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def register_sessions(subject=None, semester=None):
+    """The register's columns, in order, for one subject or a whole semester."""
+    sessions = AttendanceSession.objects.select_related('subject')
+    if subject is not None:
+        sessions = sessions.filter(subject=subject)
+    else:
+        sessions = sessions.filter(subject__semester=semester)
+    return list(sessions.order_by('subject__code', 'date', 'id'))
+
+
+def _column_labels(sessions, with_subject):
+    labels, seen = [], {}
+    for session in sessions:
+        label = f"{session.subject.code} {session.date}" if with_subject else str(session.date)
+        seen[label] = seen.get(label, 0) + 1
+        labels.append(label if seen[label] == 1 else f"{label} #{seen[label]}")
+    return labels
+
+
+def _blocks(iterable, size):
+    iterator = iter(iterable)
+    while block := list(islice(iterator, size)):
+        yield block
+
+
+def register_rows(sessions, semester, with_subject=False):
+    """
+    Yields the header, one row per student, then the footer. Students are
+    those of the semester plus anyone else holding a record in the sessions.
+    """
+    column = {session.id: i for i, session in enumerate(sessions)}
+    session_ids = list(column)
+    present_counts = [0] * len(sessions)
+    yield ['Enrollment No', 'Name', *_column_labels(sessions, with_subject), *TOTAL_COLUMNS]
+
+    students = (
+        Student.objects
+        .filter(Q(semester=semester) | Q(id__in=AttendanceRecord.objects.filter(
+            session_id__in=session_ids).values('student_id')))
+        .order_by('enrollment_number', 'id')
+        .values_list('id', 'enrollment_number', 'user__first_name', 'user__last_name')
+    )
+    for block in _blocks(students.iterator(chunk_size=CHUNK_SIZE), STUDENT_BLOCK):
+        cells = {student_id: [''] * len(sessions) for student_id, *_ in block}
+        records = (
+            AttendanceRecord.objects
+            .filter(session_id__in=session_ids, student_id__in=list(cells))
+            .values_list('student_id', 'session_id', 'is_present')
+        )
+        for student_id, session_id, is_present in records.iterator(chunk_size=CHUNK_SIZE):
+            cells[student_id][column[session_id]] = 'P' if is_present else 'A'
+
+        for student_id, enrollment_number, first, last in block:
+            row = cells.pop(student_id)
+            present = row.count('P')
+            absent = row.count('A')
+            for i, mark in enumerate(row):
+                if mark == 'P':
+                    present_counts[i] += 1
+            percentage = round(present / (present + absent) * 100, 1) if present + absent else 0.0
+            yield [enrollment_number, f"{first} {last}".strip(), *row, present, absent, percentage]
+
+    yield ['', 'Present', *present_counts, '', '', '']
+
+
+class Echo:
+    """File-like object whose write returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """Names come from editable profiles; quote text a spreadsheet would run as a formula."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def spreadsheet_stream(rows, sheet_name='Register'):
+    """
+    SpreadsheetML 2003 (an XML workbook Excel and LibreOffice open as a
+    spreadsheet), written row by row; no spreadsheet library is needed.
+    """
+    name = escape(sheet_name[:31], {'"': '&quot;'})
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<?mso-application progid="Excel.Sheet"?>\n'
+        '<Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet"'
+        ' xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet">\n'
+        '<Styles><Style ss:ID="head"><Font ss:Bold="1"/></Style></Styles>\n'
+        f'<Worksheet ss:Name="{name}"><Table>\n'
+    )
+    for index, row in enumerate(rows):
+        style = ' ss:StyleID="head"' if index == 0 else ''
+        cells = []
+        for value in row:
+            kind = 'Number' if isinstance(value, (int, float)) else 'String'
+            cells.append(f'<Cell{style}><Data ss:Type="{kind}">{escape(str(value))}</Data></Cell>')
+        yield f"<Row>{''.join(cells)}</Row>\n"
+    yield '</Table></Worksheet>\n</Workbook>\n'
@@ -0,0 +1,79 @@
+"""
+Shared view of a live session for every capture device.
+
+Marks from all cameras (and manual marking) are written to AttendanceRecord
+under the session lock, so the records themselves are the merged result
+stream: each device polls for rows changed since the last timestamp it saw.
+Record timestamps are taken while the lock is held, so they increase in
+commit order and a poll never skips a row committed after it.
+"""
+import re
+import time
+
+from django.core.cache import cache
+
+from apps.attendance.models import AttendanceRecord
+
+SOURCE_TIMEOUT = 60 * 60 * 6
+ACTIVE_WITHIN = 30  # seconds since a device's last frame
+SOURCE_MAX_LENGTH = 32
+
+
+def _sources_key(session_id):
+    return f"attendance_sources_{session_id}"
+
+
+def clean_source(value):
+    """Capture device id as sent by the page; anything unsafe is dropped."""
+    return re.sub(r'[^A-Za-z0-9_-]', '', value or '')[:SOURCE_MAX_LENGTH]
+
+
+def touch_source(session_id, source):
+    if not source:
+        return
+    # Read-modify-write: two devices touching at once can drop one entry
+    # until that device's next frame, which only affects the device count.
+    sources = cache.get(_sources_key(session_id)) or {}
+    sources[source] = time.time()
+    cache.set(_sources_key(session_id), sources, timeout=SOURCE_TIMEOUT)
+
+
+def session_sources(session_id):
+    """{source: last seen} for every device that has sent frames to the session."""
+    return cache.get(_sources_key(session_id)) or {}
+
+
+def active_sources(session_id):
+    now = time.time()
+    return sorted(s for s, seen in session_sources(session_id).items() if now - seen < ACTIVE_WITHIN)
+
+
+def clear_sources(session_id):
+    cache.delete(_sources_key(session_id))
+
+
+def session_feed(session, since=None):
+    """
+    Marks changed at or after `since` (a datetime), oldest first, and the
+    cursor to pass next time. Rows at exactly `since` are sent again;
+    clients key them by student.
+    """
+    records = AttendanceRecord.objects.filter(session=session)
+    if since is not None:
+        records = records.filter(timestamp__gte=since)
+    events = [
+        {
+            'student_id': student_id,
+            'name': f"{first} {last}".strip(),
+            'is_present': is_present,
+            'method': method,
+            'source': source,
+            'at': timestamp.isoformat(),
+        }
+        for student_id, first, last, is_present, method, source, timestamp in records.order_by('timestamp', 'id').values_list(
+            'student_id', 'student__user__first_name', 'student__user__last_name',
+            'is_present', 'method', 'source', 'timestamp',
+        )
+    ]
+    cursor = events[-1]['at'] if events else (since.isoformat() if since else None)
+    return events, cursor
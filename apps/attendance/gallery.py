@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from filelock import FileLock
+
+from apps.attendance.models import FaceData, ENCODING_BYTES
+from apps.attendance.matcher import FaceGallery, ENCODING_DIM
+
+logger = logging.getLogger(__name__)
+
+GALLERY_TIMEOUT = 60 * 60 * 12
+BUILD_LOCK_TIMEOUT = 120
+BUILD_WAIT = 30
+BUILD_POLL = 0.2
+
+# Process-wide index: semester -> (version, FaceGallery). Every session of a
+# semester shares the same prepared matrix; a version stored in the cache
+# tells each process when its copy is stale. The prepared matrix is also put
+# in the shared cache so other workers can pick it up without the DB.
+_galleries = {}
+_semester_locks = {}
+_warming = set()
+_lock = threading.Lock()
+
+
+def _version_key(semester):
+    return f"face_gallery_version_{semester}"
+
+
+def _gallery_key(semester, version):
+    return f"face_gallery_{semester}_{version}"
+
+
+def _build_key(semester, version):
+    return f"face_gallery_build_{semester}_{version}"
+
+
+def _claim_build(build_key):
+    """cache.add as a cross-process mutex. The file backend's add is a check-then-write, so serialise it."""
+    if settings.CACHE_BACKEND == 'file':
+        location = settings.CACHES['default']['LOCATION']
+        os.makedirs(location, exist_ok=True)
+        with FileLock(os.path.join(location, 'gallery-build.lock')):
+            return cache.add(build_key, os.getpid(), timeout=BUILD_LOCK_TIMEOUT)
+    return cache.add(build_key, os.getpid(), timeout=BUILD_LOCK_TIMEOUT)
+
+
+def _semester_lock(semester):
+    with _lock:
+        return _semester_locks.setdefault(semester, threading.Lock())
+
+
+def get_gallery_version(semester):
+    key = _version_key(semester)
+    version = cache.get(key)
+    if version is None:
+        # A missing key (first use or evicted) gets a fresh token, which forces
+        # every process to rebuild instead of trusting an old copy.
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_gallery_version(*semesters):
+    for semester in set(semesters):
+        if semester is None:
+            continue
+        cache.set(_version_key(semester), uuid.uuid4().hex, timeout=None)
+
+
+def load_semester_gallery(semester):
+    rows = FaceData.objects.filter(
+        student__semester=semester,
+        encoding__isnull=False,
+    ).values_list('student_id', 'student__user__first_name', 'encoding')
+
+    student_ids, names, blobs = [], [], []
+    for student_id, name, blob in rows:
+        if len(blob) != ENCODING_BYTES:
+            logger.warning(f"Bad face encoding for student {student_id}: {len(blob)} bytes")
+            continue
+        student_ids.append(student_id)
+        names.append(name)
+        blobs.append(blob)
+
+    encodings = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(-1, ENCODING_DIM)
+    return FaceGallery(encodings, student_ids, names)
+
+
+def _prepared_gallery(semester, version):
+    """This version's gallery from the process or the shared cache, or None."""
+    entry = _galleries.get(semester)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    shared = cache.get(_gallery_key(semester, version))
+    if shared is None:
+        return None
+    gallery = FaceGallery(*shared)
+    _galleries[semester] = (version, gallery)
+    return gallery
+
+
+def get_semester_gallery(semester):
+    version = get_gallery_version(semester)
+    entry = _galleries.get(semester)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    # One build per semester at a time in this process...
+    with _semester_lock(semester):
+        gallery = _prepared_gallery(semester, version)
+        if gallery is not None:
+            return gallery
+
+        # ...and across processes: whoever adds the build key loads from the DB,
+        # everyone else waits for the result to show up in the shared cache.
+        build_key = _build_key(semester, version)
+        if not _claim_build(build_key):
+            deadline = time.monotonic() + BUILD_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(BUILD_POLL)
+                gallery = _prepared_gallery(semester, version)
+                if gallery is not None:
+                    return gallery
+            logger.warning(f"Timed out waiting for the semester {semester} gallery build; building it here")
+
+        try:
+            gallery = load_semester_gallery(semester)
+            cache.set(
+                _gallery_key(semester, version),
+                (gallery.encodings, gallery.student_ids, gallery.names),
+                timeout=GALLERY_TIMEOUT,
+            )
+        finally:
+            cache.delete(build_key)
+        logger.info(f"Built face gallery for semester {semester}: {len(gallery)} students")
+        _galleries[semester] = (version, gallery)
+        return gallery
+
+
+def peek_semester_gallery(semester):
+    """The current gallery if it is already prepared somewhere, without building it."""
+    return _prepared_gallery(semester, get_gallery_version(semester))
+
+
+def _warm(semester):
+    try:
+        get_semester_gallery(semester)
+    except Exception as e:
+        logger.error(f"Background gallery warm-up failed for semester {semester}: {e}")
+    finally:
+        with _lock:
+            _warming.discard(semester)
+        connection.close()
+
+
+def warm_semester_gallery(semester):
+    """
+    Prepare the semester gallery in a background thread, unless it is ready
+    or already being prepared by this process. Returns True when ready now.
+    """
+    if peek_semester_gallery(semester) is not None:
+        return True
+    with _lock:
+        if semester in _warming:
+            return False
+        _warming.add(semester)
+    threading.Thread(target=_warm, args=(semester,), name=f'gallery-warm-{semester}', daemon=True).start()
+    return False
@@ -0,0 +1,205 @@
+"""
+Bulk attendance import from CSV (paper rosters, days the camera failed).
+
+One row per mark: enrollment_number, subject_code, date, status. Each
+(subject, date) maps to that day's first session of the subject, and a
+closed session is created when there is none. The file is parsed as a
+stream and written in chunks, each in its own transaction: students and
+subjects are resolved through maps loaded once, sessions and existing
+records with one query per chunk, and marks are written with a bulk
+upsert. Bad rows are reported by line number and skipped; the rest of
+the file is still imported.
+
+bulk_create does not send signals or update the summaries, so the summary
+rows of every subject written are rebuilt once at the end, also when a
+failing chunk stops the import part way.
+"""
+import csv
+import logging
+from datetime import datetime
+
+from django.db import connection, transaction
+
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.attendance.models import AttendanceRecord, AttendanceSession
+from apps.attendance.services import forget_present, refresh_attendance_percentages
+from apps.attendance.summary import rebuild_attendance_summary
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['enrollment_number', 'subject_code', 'date', 'status']
+CHUNK_ROWS = 5000
+INSERT_BATCH = 1000
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y']
+STATUS_VALUES = {
+    'p': True, 'present': True, '1': True, 'y': True, 'yes': True, 'true': True,
+    'a': False, 'absent': False, '0': False, 'n': False, 'no': False, 'false': False,
+}
+IMPORT_SOURCE = 'csv-import'
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0  # Valid rows in chunks that were committed
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.sessions_created = 0
+        self.errors = []  # (line number, message)
+        self.subject_ids = set()  # Written (committed) so far
+        self.student_ids = set()
+        self.failed = None  # Why the import stopped early, if it did
+
+
+def _parse_date(value, cache):
+    if value not in cache:
+        for fmt in DATE_FORMATS:
+            try:
+                cache[value] = datetime.strptime(value, fmt).date()
+                break
+            except ValueError:
+                continue
+        else:
+            cache[value] = None
+    return cache[value]
+
+
+def _resolve_sessions(keys, result):
+    """{(subject_id, date): session_id}, creating closed sessions for the missing keys."""
+    subject_ids = {subject_id for subject_id, _ in keys}
+    dates = {day for _, day in keys}
+
+    def existing():
+        found = {}
+        sessions = (
+            AttendanceSession.objects.filter(subject_id__in=subject_ids, date__in=dates)
+            .order_by('id').values_list('subject_id', 'date', 'id')
+        )
+        for subject_id, day, session_id in sessions:
+            found.setdefault((subject_id, day), session_id)
+        return found
+
+    sessions = existing()
+    missing = keys - sessions.keys()
+    if missing:
+        AttendanceSession.objects.bulk_create([
+            AttendanceSession(subject_id=subject_id, date=day, status=False) for subject_id, day in missing
+        ])
+        result.sessions_created += len(missing)
+        sessions = existing()  # MySQL does not return ids from bulk_create
+    return sessions
+
+
+def _write_chunk(marks, rows, result):
+    """marks: {(subject_id, date, student_id): is_present}, from `rows` valid rows"""
+    with transaction.atomic():
+        sessions = _resolve_sessions({(subject_id, day) for subject_id, day, _ in marks}, result)
+        # Same row lock as live marking, so an import into an open session queues behind the cameras.
+        list(AttendanceSession.objects.select_for_update().filter(pk__in=sessions.values()).values_list('pk', flat=True))
+
+        wanted = {
+            (sessions[(subject_id, day)], student_id): is_present
+            for (subject_id, day, student_id), is_present in marks.items()
+        }
+        existing = dict(
+            ((session_id, student_id), is_present)
+            for session_id, student_id, is_present in AttendanceRecord.objects.filter(
+                session_id__in={session_id for session_id, _ in wanted},
+                student_id__in={student_id for _, student_id in wanted},
+            ).values_list('session_id', 'student_id', 'is_present')
+        )
+        changed = [key for key, is_present in wanted.items() if existing.get(key, not is_present) != is_present]
+
+        upsert_kwargs = {
+            'update_conflicts': True,
+            'update_fields': ['is_present', 'method', 'source', 'timestamp'],
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            upsert_kwargs['unique_fields'] = ['session', 'student']
+        AttendanceRecord.objects.bulk_create(
+            [
+                AttendanceRecord(
+                    session_id=session_id, student_id=student_id, is_present=wanted[(session_id, student_id)],
+                    method='MANUAL', source=IMPORT_SOURCE,
+                )
+                for session_id, student_id in changed
+            ],
+            batch_size=INSERT_BATCH,
+            **upsert_kwargs,
+        )
+
+    created = sum(1 for key in changed if key not in existing)
+    result.created += created
+    result.updated += len(changed) - created
+    result.unchanged += len(wanted) - len(changed)
+    result.imported += rows
+    result.subject_ids.update(subject_id for subject_id, _, _ in marks)
+    result.student_ids.update(student_id for _, student_id in changed)
+    forget_present(set(sessions.values()))
+
+
+def import_attendance_csv(lines):
+    """
+    Import marks from an iterable of CSV text lines (with a header row).
+    Raises ValueError if required columns are missing; problems with
+    individual rows are collected in ImportResult.errors. If a chunk fails
+    to write, the import stops there (ImportResult.failed); chunks already
+    committed stay, and their summaries are rebuilt either way.
+    """
+    reader = csv.DictReader(lines)
+    fields = [(name or '').strip().lower() for name in (reader.fieldnames or [])]
+    missing_columns = [column for column in COLUMNS if column not in fields]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+    reader.fieldnames = fields
+
+    students = dict(Student.objects.values_list('enrollment_number', 'id'))
+    subjects = dict(Subject.objects.values_list('code', 'id'))
+    dates = {}
+    result = ImportResult()
+    marks, pending = {}, 0
+    line_no = 1
+
+    try:
+        for row in reader:
+            line_no = reader.line_num
+            result.rows += 1
+            enrollment = (row.get('enrollment_number') or '').strip()
+            code = (row.get('subject_code') or '').strip()
+            day = _parse_date((row.get('date') or '').strip(), dates)
+            status = STATUS_VALUES.get((row.get('status') or '').strip().lower())
+
+            if enrollment not in students:
+                result.errors.append((line_no, f"Unknown enrollment number '{enrollment}'"))
+            elif code not in subjects:
+                result.errors.append((line_no, f"Unknown subject code '{code}'"))
+            elif day is None:
+                result.errors.append((line_no, f"Invalid date '{row.get('date')}' (use YYYY-MM-DD)"))
+            elif status is None:
+                result.errors.append((line_no, f"Invalid status '{row.get('status')}' (use P or A)"))
+            else:
+                # A repeated row for the same mark overrides the earlier one.
+                marks[(subjects[code], day, students[enrollment])] = status
+                pending += 1
+
+            if len(marks) >= CHUNK_ROWS:
+                _write_chunk(marks, pending, result)
+                marks, pending = {}, 0
+        if marks:
+            _write_chunk(marks, pending, result)
+    except Exception as e:
+        logger.error(f"Attendance import stopped near line {line_no}: {e}")
+        result.failed = f"Import stopped near row {line_no}: {e}"
+    finally:
+        if result.subject_ids:
+            rebuild_attendance_summary(result.subject_ids)
+            refresh_attendance_percentages(list(result.student_ids))
+    logger.info(
+        f"Attendance import: {result.rows} rows, {result.imported} imported, {result.created} created, "
+        f"{result.updated} updated, {result.unchanged} unchanged, {result.sessions_created} sessions created, "
+        f"{len(result.errors)} errors"
+    )
+    return result
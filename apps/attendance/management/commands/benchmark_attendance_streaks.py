@@ -0,0 +1,185 @@
+"""
+Absence Streak Benchmark
+========================
+Times the ways of computing each student's longest absence streak on a
+synthetic semester written to the configured database inside a transaction
+that is rolled back at the end, so nothing is left behind.
+
+Engines:
+    loop      the original approach: every record streamed to Python ordered
+              by student and session date, counted in a loop (split by
+              subject here so all engines return the same numbers)
+    sql       one window-function (gaps and islands) query, see attendance/streaks.py
+    timeline  packed per-subject timelines on AttendanceSummary, see attendance/timeline.py;
+              the one-off rebuild that fills them is reported separately
+
+Usage:
+    python manage.py benchmark_attendance_streaks
+    python manage.py benchmark_attendance_streaks --rows 100000 --engines sql,timeline
+"""
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.attendance.models import AttendanceRecord, AttendanceSession
+from apps.attendance.streaks import max_absent_streaks_sql
+from apps.attendance.summary import rebuild_attendance_summary, subject_timelines
+from apps.attendance.timeline import absent_runs
+
+ENGINES = ('loop', 'sql', 'timeline')
+SEMESTER = 99  # Not a real semester, so the synthetic students never mix with real ones
+INSERT_BATCH = 20000
+
+
+def loop_streaks(student_ids):
+    streak_map = {sid: 0 for sid in student_ids}
+    current, previous = 0, None
+    records = (
+        AttendanceRecord.objects
+        .filter(student_id__in=student_ids)
+        .order_by('student_id', 'session__subject_id', 'session__date', 'session_id')
+        .values_list('student_id', 'session__subject_id', 'is_present')
+    )
+    for student_id, subject_id, is_present in records.iterator(chunk_size=5000):
+        if (student_id, subject_id) != previous:
+            current, previous = 0, (student_id, subject_id)
+        if not is_present:
+            current += 1
+            if current > streak_map[student_id]:
+                streak_map[student_id] = current
+        else:
+            current = 0
+    return streak_map
+
+
+def timeline_streaks(student_ids):
+    row_students, _, present, absent = subject_timelines(student_ids)
+    _, longest = absent_runs(present, absent)
+    position = {sid: i for i, sid in enumerate(student_ids)}
+    totals = np.zeros(len(student_ids), dtype=np.int64)
+    np.maximum.at(totals, [position[sid] for sid in row_students.tolist()], longest)
+    return dict(zip(student_ids, totals.tolist()))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark absence streak computation (Python loop, SQL window functions, packed timelines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='100000,1000000', help='Comma-separated AttendanceRecord counts')
+        parser.add_argument('--engines', default=','.join(ENGINES), help=f"Comma-separated subset of {', '.join(ENGINES)}")
+        parser.add_argument('--subjects', type=int, default=6, help='Subjects in the synthetic semester')
+        parser.add_argument('--sessions', type=int, default=50, help='Sessions held per subject')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per engine; the best is reported')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['rows'].split(',') if s.strip()]
+        engines = [e.strip() for e in options['engines'].split(',') if e.strip()]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown engine(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Absence streak benchmark ({options['subjects']} subjects x {options['sessions']} sessions) ===\n"
+        ))
+        self.stdout.write(f"{'records':>9} {'students':>9} {'engine':>9} {'seconds':>9} {'speedup':>8}  notes")
+
+        for rows in sizes:
+            with transaction.atomic():
+                student_ids = self._populate(rows, options)
+                self._run(rows, student_ids, engines, options)
+                transaction.set_rollback(True)
+            self.stdout.write('')
+
+        self.stdout.write(self.style.SUCCESS('Done (synthetic data rolled back).'))
+
+    def _populate(self, rows, options):
+        rng = np.random.default_rng(options['seed'])
+        per_student = options['subjects'] * options['sessions']
+        count = max(1, rows // per_student)
+        tag = f"streakbench{rng.integers(1 << 30)}"
+
+        User = get_user_model()
+        User.objects.bulk_create(
+            [User(username=f"{tag}_{i}", email=f"{tag}_{i}@bench.invalid", password='!') for i in range(count)],
+            batch_size=INSERT_BATCH,
+        )
+        user_ids = User.objects.filter(username__startswith=f"{tag}_").values_list('id', flat=True)
+        Student.objects.bulk_create(
+            [Student(user_id=uid, enrollment_number=f"SB{uid}", semester=SEMESTER) for uid in user_ids],
+            batch_size=INSERT_BATCH,
+        )
+        student_ids = list(Student.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', flat=True))
+
+        Subject.objects.bulk_create([
+            Subject(name=f"Benchmark {s}", code=f"{tag[-8:]}{s}", semester=SEMESTER)
+            for s in range(options['subjects'])
+        ])
+        subject_ids = list(Subject.objects.filter(code__startswith=tag[-8:]).values_list('id', flat=True))
+        # bulk_create skips the post_save signal, so no summaries are maintained while loading.
+        AttendanceSession.objects.bulk_create([
+            AttendanceSession(subject_id=subject_id, ordinal=n, status=False)
+            for subject_id in subject_ids for n in range(options['sessions'])
+        ])
+        session_ids = list(
+            AttendanceSession.objects.filter(subject_id__in=subject_ids).order_by('id').values_list('id', flat=True)
+        )
+
+        # Sticky absences: a student who missed the last class is likelier to miss the next.
+        shape = (count, len(session_ids))
+        noise = rng.random(shape)
+        absent = np.zeros(shape, dtype=bool)
+        absent[:, 0] = noise[:, 0] < 0.15
+        for j in range(1, shape[1]):
+            absent[:, j] = noise[:, j] < np.where(absent[:, j - 1], 0.55, 0.1)
+
+        started = time.perf_counter()
+        batch = []
+        for i, sid in enumerate(student_ids):
+            batch.extend(
+                AttendanceRecord(session_id=session_id, student_id=sid, is_present=not absent[i, j], method='MANUAL')
+                for j, session_id in enumerate(session_ids)
+            )
+            if len(batch) >= INSERT_BATCH:
+                AttendanceRecord.objects.bulk_create(batch)
+                batch = []
+        AttendanceRecord.objects.bulk_create(batch)
+        self.stdout.write(
+            f"{count * len(session_ids):>9} {count:>9} {'(load)':>9} {time.perf_counter() - started:>9.2f}"
+        )
+        self._subject_ids = subject_ids
+        return student_ids
+
+    def _best(self, fn, student_ids, repeat):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            result = fn(student_ids)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _run(self, rows, student_ids, engines, options):
+        reference, baseline = None, None
+        records = AttendanceRecord.objects.filter(student_id__in=student_ids).count()
+        for engine in engines:
+            notes = ''
+            if engine == 'timeline':
+                started = time.perf_counter()
+                rebuild_attendance_summary(self._subject_ids)
+                notes = f"one-off summary rebuild {time.perf_counter() - started:.2f}s; "
+            fn = {'loop': loop_streaks, 'sql': max_absent_streaks_sql, 'timeline': timeline_streaks}[engine]
+            seconds, result = self._best(fn, student_ids, options['repeat'])
+
+            if reference is None:
+                reference, baseline = result, seconds
+            notes += 'matches' if result == reference else self.style.ERROR('DIFFERS from first engine')
+            speedup = f"{baseline / seconds:.1f}x" if seconds else '-'
+            self.stdout.write(
+                f"{records:>9} {len(student_ids):>9} {engine:>9} {seconds:>9.3f} {speedup:>8}  {notes}"
+            )
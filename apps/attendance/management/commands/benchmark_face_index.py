@@ -0,0 +1,78 @@
+"""
+Campus Face Index Benchmark
+===========================
+Compares the IVF campus index against brute-force matching on synthetic
+galleries. Runs offline: no camera, no database, no dlib.
+
+Usage:
+    python manage.py benchmark_face_index
+    python manage.py benchmark_face_index --sizes 1000,10000 --queries 500 --nprobe 16
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.attendance.ann import FaceIndex, DEFAULT_NPROBE
+from apps.attendance.matcher import FaceGallery, DEFAULT_TOLERANCE
+from apps.attendance.synthetic import SyntheticFaces
+
+
+def _percentiles(samples_ms):
+    return np.percentile(samples_ms, [50, 95]) if samples_ms else (0.0, 0.0)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark campus face index query latency vs. gallery size (synthetic data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,5000,10000,20000,50000', help='Comma-separated gallery sizes')
+        parser.add_argument('--queries', type=int, default=200, help='Queries per gallery size')
+        parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help='Lists probed per query')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Campus face index (nprobe={options['nprobe']}, tolerance={DEFAULT_TOLERANCE}) ===\n"
+        ))
+        self.stdout.write(
+            f"{'gallery':>8} {'build s':>8} {'lists':>6} {'brute p50':>10} {'brute p95':>10} "
+            f"{'ivf p50':>8} {'ivf p95':>8} {'speedup':>8} {'recall@1':>9}"
+        )
+
+        for size in sizes:
+            faces = SyntheticFaces(size, seed=options['seed'])
+            encodings, ids = faces.gallery, faces.ids
+            queries, _ = faces.queries(options['queries'])
+
+            started = time.perf_counter()
+            index = FaceIndex()
+            index.add(ids, encodings)
+            index.train(seed=options['seed'])
+            build_s = time.perf_counter() - started
+
+            brute = FaceGallery(encodings, ids.tolist(), ids.tolist())
+            brute_ms, ivf_ms, agree, found = [], [], 0, 0
+            for query in queries:
+                t0 = time.perf_counter()
+                exact = brute.match(query[None, :], tolerance=DEFAULT_TOLERANCE)[0]
+                t1 = time.perf_counter()
+                approx = index.search(query, k=1, threshold=DEFAULT_TOLERANCE, nprobe=options['nprobe'])[0]
+                t2 = time.perf_counter()
+                brute_ms.append((t1 - t0) * 1000)
+                ivf_ms.append((t2 - t1) * 1000)
+                if exact is not None:
+                    found += 1
+                    agree += bool(approx) and approx[0][0] == exact.student_id
+
+            b50, b95 = _percentiles(brute_ms)
+            i50, i95 = _percentiles(ivf_ms)
+            lists = len(index.centroids) if index.centroids is not None else 0
+            recall = agree / found if found else 1.0
+            self.stdout.write(
+                f"{size:>8} {build_s:>8.2f} {lists:>6} {b50:>9.3f}ms {b95:>9.3f}ms "
+                f"{i50:>7.3f}ms {i95:>7.3f}ms {b50 / i50 if i50 else 0:>7.1f}x {recall:>9.3f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('\nDone.'))
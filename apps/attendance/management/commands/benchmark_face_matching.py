@@ -0,0 +1,146 @@
+"""
+Face Matching Benchmark
+=======================
+Times the matching engines on synthetic, identity-clustered 128-d encodings.
+Runs offline: no camera, no database, no dlib.
+
+Engines:
+    legacy   the original recognize_face path: cached encodings rebuilt into
+             a list of arrays per request, face_recognition.compare_faces at
+             tolerance 0.5, first match wins
+    gallery  FaceGallery (vectorised nearest match, used per class)
+    index    FaceIndex (IVF approximate search, used campus-wide)
+
+Usage:
+    python manage.py benchmark_face_matching
+    python manage.py benchmark_face_matching --sizes 300,10000 --engines gallery,index
+"""
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.attendance.ann import FaceIndex, DEFAULT_NPROBE
+from apps.attendance.matcher import FaceGallery, DEFAULT_TOLERANCE
+from apps.attendance.synthetic import SyntheticFaces
+
+ENGINES = ('legacy', 'gallery', 'index')
+
+
+def _compare_faces(known_encodings, face_encoding_to_check, tolerance):
+    # Same arithmetic as face_recognition.compare_faces/face_distance, without importing dlib.
+    if len(known_encodings) == 0:
+        return []
+    return list(np.linalg.norm(known_encodings - face_encoding_to_check, axis=1) <= tolerance)
+
+
+class LegacyEngine:
+
+    def __init__(self, encodings, ids):
+        # What the old view kept in the cache: one dict of plain floats per student.
+        self.cached_data = [{'encoding': e.tolist(), 'student_id': int(i)} for e, i in zip(encodings, ids)]
+
+    def match(self, query):
+        known_encodings = [np.array(d['encoding']) for d in self.cached_data]
+        matches = _compare_faces(known_encodings, query, DEFAULT_TOLERANCE)
+        if True in matches:
+            return self.cached_data[matches.index(True)]['student_id']
+        return -1
+
+
+class GalleryEngine:
+
+    def __init__(self, encodings, ids):
+        self.gallery = FaceGallery(encodings, ids.tolist(), [''] * len(ids))
+
+    def match(self, query):
+        found = self.gallery.match(query[None, :], tolerance=DEFAULT_TOLERANCE)[0]
+        return found.student_id if found is not None else -1
+
+
+class IndexEngine:
+
+    def __init__(self, encodings, ids, nprobe=DEFAULT_NPROBE):
+        self.nprobe = nprobe
+        self.index = FaceIndex()
+        self.index.add(ids, encodings)
+
+    def match(self, query):
+        found = self.index.search(query, k=1, threshold=DEFAULT_TOLERANCE, nprobe=self.nprobe)[0]
+        return found[0][0] if found else -1
+
+
+class Command(BaseCommand):
+    help = 'Benchmark face matching engines on synthetic galleries (throughput, latency, memory, accuracy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='50,300,1000,10000,50000', help='Comma-separated gallery sizes')
+        parser.add_argument('--engines', default=','.join(ENGINES), help=f"Comma-separated subset of {', '.join(ENGINES)}")
+        parser.add_argument('--queries', type=int, default=200, help='Queries per gallery size')
+        parser.add_argument('--legacy-queries', type=int, default=50,
+                            help='Query cap for the legacy engine (it rebuilds the gallery on every call)')
+        parser.add_argument('--impostor-rate', type=float, default=0.1, help='Share of queries from unregistered people')
+        parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help='Lists probed by the index engine')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        engines = [e.strip() for e in options['engines'].split(',') if e.strip()]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown engine(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Face matching benchmark (tolerance={DEFAULT_TOLERANCE}, {options['queries']} queries, "
+            f"{options['impostor_rate']:.0%} impostors) ===\n"
+        ))
+        self.stdout.write(
+            f"{'gallery':>8} {'engine':>8} {'build s':>8} {'memory':>9} {'p50':>9} {'p95':>9} {'p99':>9} "
+            f"{'qps':>9} {'top-1':>7} {'false+':>7}"
+        )
+
+        for size in sizes:
+            faces = SyntheticFaces(size, seed=options['seed'])
+            queries, truth = faces.queries(options['queries'], impostor_rate=options['impostor_rate'])
+            for engine in engines:
+                limit = options['legacy_queries'] if engine == 'legacy' else len(queries)
+                self._run(engine, faces, queries[:limit], truth[:limit], options)
+            self.stdout.write('')
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def _build(self, engine, faces, options):
+        # Copied inside the traced block so every engine is charged for its encodings.
+        encodings = faces.gallery.copy()
+        if engine == 'legacy':
+            return LegacyEngine(encodings, faces.ids)
+        if engine == 'gallery':
+            return GalleryEngine(encodings, faces.ids)
+        return IndexEngine(encodings, faces.ids, nprobe=options['nprobe'])
+
+    def _run(self, engine, faces, queries, truth, options):
+        tracemalloc.start()
+        started = time.perf_counter()
+        matcher = self._build(engine, faces, options)
+        build_s = time.perf_counter() - started
+        memory_mb = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+        tracemalloc.stop()
+
+        latencies, predicted = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            predicted.append(matcher.match(query))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        latencies = np.array(latencies)
+        predicted = np.array(predicted)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        qps = len(latencies) / (latencies.sum() / 1000) if latencies.sum() else 0.0
+        accuracy = float(np.mean(predicted == truth))
+        false_accepts = int(np.sum((truth == -1) & (predicted != -1)))
+
+        self.stdout.write(
+            f"{len(faces.ids):>8} {engine:>8} {build_s:>8.2f} {memory_mb:>7.1f}MB "
+            f"{p50:>7.3f}ms {p95:>7.3f}ms {p99:>7.3f}ms {qps:>9.0f} {accuracy:>7.1%} {false_accepts:>7}"
+        )
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+
+from apps.attendance.campus_index import rebuild_campus_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the campus-wide face index from all FaceData encodings and compact its change log'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = rebuild_campus_index()
+        lists = len(index.centroids) if index.centroids is not None else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index)} students in {time.perf_counter() - started:.2f}s '
+            f'({lists} lists{"" if lists else ", flat search"})'
+        ))
@@ -0,0 +1,175 @@
+"""
+Multi-camera Attendance Load Test
+=================================
+Drives several cameras per classroom, across several classrooms at once,
+through the same present-cache check, gallery match and serialised
+attendance write that recognize_batch performs after encoding (dlib is not
+needed: frames are synthetic encodings). Each camera is a thread with its
+own database connection.
+
+Checks that every student's "Marked Present" reply went to exactly one
+camera, that each session has one record per marked student, and that the
+merged feed shows the same marks to every device.
+Synthetic classrooms are deleted afterwards unless --keep is given.
+Meant for the MySQL deployment; on SQLite every write takes the database-wide
+lock (use OPTIONS transaction_mode IMMEDIATE) and tail latencies reflect that.
+
+Usage:
+    python manage.py load_test_attendance                      # 10 classrooms x 4 cameras
+    python manage.py load_test_attendance --classrooms 2 --cameras 2 --batches 20
+"""
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.attendance.feed import session_feed
+from apps.attendance.matcher import FaceGallery, DEFAULT_TOLERANCE
+from apps.attendance.models import AttendanceRecord, AttendanceSession
+from apps.attendance.services import get_present_ids, mark_present
+from apps.attendance.synthetic import SyntheticFaces, CAPTURE_NOISE
+
+SEMESTER_BASE = 900  # Synthetic classrooms get semesters 900+, away from real ones
+
+
+class Classroom:
+
+    def __init__(self, session, gallery, faces):
+        self.session = session
+        self.gallery = gallery
+        self.faces = faces
+        self.marked_by = Counter()  # student id -> "Marked Present" replies
+        self.lock = threading.Lock()
+
+
+class Command(BaseCommand):
+    help = 'Load test concurrent multi-camera attendance writes (cameras x classrooms)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classrooms', type=int, default=10)
+        parser.add_argument('--cameras', type=int, default=4, help='Cameras per classroom')
+        parser.add_argument('--students', type=int, default=60, help='Students per classroom')
+        parser.add_argument('--batches', type=int, default=40, help='Frame batches sent by each camera')
+        parser.add_argument('--faces', type=int, default=4, help='Faces seen per batch')
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between a camera\'s batches')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic classrooms')
+
+    def handle(self, *args, **options):
+        tag = f"loadtest{int(time.time())}"
+        classrooms = [self._classroom(tag, i, options) for i in range(options['classrooms'])]
+        latencies, errors = [], []
+        results_lock = threading.Lock()
+
+        def camera(room, index):
+            rng = np.random.default_rng(options['seed'] + index * 1009 + room.session.id)
+            source = f"cam-{index}"
+            try:
+                for _ in range(options['batches']):
+                    picked = rng.choice(len(room.faces.ids), size=options['faces'], replace=False)
+                    centers = room.faces.centers[picked]
+                    encodings = (centers + rng.normal(0.0, CAPTURE_NOISE, centers.shape)).astype(np.float32)
+                    started = time.perf_counter()
+                    get_present_ids(room.session)
+                    matches = [m for m in room.gallery.match(encodings, tolerance=DEFAULT_TOLERANCE) if m]
+                    newly = mark_present(room.session, [m.student_id for m in matches], source=source)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with room.lock:
+                        room.marked_by.update(newly)
+                    with results_lock:
+                        latencies.append(elapsed)
+                    time.sleep(options['interval'])
+            except Exception as e:
+                with results_lock:
+                    errors.append(f"{source} in session {room.session.id}: {e}")
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=camera, args=(room, i), daemon=True)
+            for room in classrooms for i in range(options['cameras'])
+        ]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== {len(classrooms)} classrooms x {options['cameras']} cameras, "
+            f"{options['batches']} batches each ===\n"
+        ))
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        try:
+            self._report(classrooms, latencies, errors, wall)
+        finally:
+            if not options['keep']:
+                self._cleanup(tag)
+
+    def _classroom(self, tag, index, options):
+        faces = SyntheticFaces(options['students'], seed=options['seed'] + index)
+        semester = SEMESTER_BASE + index
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f"{tag}_{index}_{i}", email=f"{tag}_{index}_{i}@load.invalid", password='!')
+            for i in range(options['students'])
+        ])
+        user_ids = list(
+            User.objects.filter(username__startswith=f"{tag}_{index}_").order_by('id').values_list('id', flat=True)
+        )
+        Student.objects.bulk_create([
+            Student(user_id=uid, enrollment_number=f"LT{uid}", semester=semester) for uid in user_ids
+        ])
+        student_ids = list(Student.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', flat=True))
+        subject = Subject.objects.create(name=f"Load test {index}", code=f"{tag[-6:]}{index}", semester=semester)
+        session = AttendanceSession.objects.create(subject=subject)
+        # Built in memory: the gallery cache is not what is under test, and no FaceData means
+        # nothing reaches the campus index.
+        gallery = FaceGallery(faces.gallery, student_ids, [f"Student {sid}" for sid in student_ids])
+        return Classroom(session, gallery, faces)
+
+    def _report(self, classrooms, latencies, errors, wall):
+        lat = np.array(latencies) if latencies else np.zeros(1)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        self.stdout.write(
+            f"batches {len(latencies)} in {wall:.2f}s ({len(latencies) / wall:.0f}/s)  "
+            f"check+match+write p50 {p50:.1f}ms  p95 {p95:.1f}ms  p99 {p99:.1f}ms"
+        )
+
+        problems = list(errors)
+        for room in classrooms:
+            session = room.session
+            records = Counter(
+                AttendanceRecord.objects.filter(session=session, is_present=True).values_list('student_id', flat=True)
+            )
+            repeated = [sid for sid, n in room.marked_by.items() if n > 1]
+            if repeated:
+                problems.append(f"session {session.id}: {len(repeated)} students reported as newly marked twice")
+            if set(records) != set(room.marked_by):
+                problems.append(f"session {session.id}: replies and records disagree")
+            events, _ = session_feed(session)
+            if {e['student_id'] for e in events if e['is_present']} != set(records):
+                problems.append(f"session {session.id}: feed differs from records")
+            sources = Counter(
+                AttendanceRecord.objects.filter(session=session).values_list('source', flat=True)
+            )
+            self.stdout.write(
+                f"  session {session.id}: {len(records)}/{len(room.gallery)} present, by camera "
+                + ', '.join(f"{s}={n}" for s, n in sorted(sources.items()))
+            )
+
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS('Consistent: one record and one "Marked Present" per student.'))
+
+    def _cleanup(self, tag):
+        Subject.objects.filter(code__startswith=tag[-6:], semester__gte=SEMESTER_BASE).delete()
+        get_user_model().objects.filter(username__startswith=f"{tag}_").delete()
@@ -0,0 +1,39 @@
+"""
+Rebuild Attendance Summaries
+============================
+Recomputes the AttendanceSummary rows (per student and subject totals,
+absence streaks and packed attendance timelines) and the session ordinals
+they are indexed by from the attendance records. The rows are normally kept up
+to date as attendance is written; run this after a data import, direct
+database edits, or when first deploying the summary table.
+
+Usage:
+    python manage.py rebuild_attendance_summary
+    python manage.py rebuild_attendance_summary --subject 12 --subject 14
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.attendance.services import refresh_attendance_percentages
+from apps.attendance.summary import rebuild_attendance_summary
+from apps.students.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Recompute per student, per subject attendance summaries from the attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append', dest='subjects',
+                            help='Subject id to rebuild (repeatable); default is every subject')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild_attendance_summary(options['subjects'])
+        students = Student.objects.filter(attendance_summaries__isnull=False).distinct()
+        if options['subjects']:
+            students = students.filter(attendance_summaries__subject_id__in=options['subjects'])
+        refresh_attendance_percentages(list(students.values_list('id', flat=True)))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} summary rows in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,190 @@
+"""
+Bulk Face Re-encoding
+=====================
+Recomputes FaceData encodings from the stored reference photos, e.g. after a
+detection/encoding model change or a bad import. Images are encoded in a
+process pool across all cores, outside the web tier, and written back in
+batched updates. A row whose photo was replaced during the run keeps the
+newer registration. Semester galleries and the campus index are refreshed
+after every batch, so an interrupted run leaves them consistent.
+
+Usage:
+    python manage.py reencode_faces
+    python manage.py reencode_faces --dry-run --report failures.csv
+    python manage.py reencode_faces --resume          # continue after an interrupted run
+    python manage.py reencode_faces --missing-only --workers 4
+    python manage.py reencode_faces --pending         # registrations still waiting to be encoded
+"""
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.attendance.campus_index import record_face_changes
+from apps.attendance.encoder import encode_reference_file, pipeline_options, _warm_up
+from apps.attendance.gallery import bump_gallery_version
+from apps.attendance.models import FaceData
+from apps.attendance.registration import store_encoding_result
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, 'ml_models', 'reencode_checkpoint.json')
+
+
+class Command(BaseCommand):
+    help = 'Re-encode every FaceData reference photo in parallel and save the encodings in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Encoder processes (default: all cores)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows written per UPDATE batch')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='Progress file used by --resume')
+        parser.add_argument('--resume', action='store_true', help='Skip rows already done by an interrupted run')
+        parser.add_argument('--dry-run', action='store_true', help='Encode and report, but do not save anything')
+        parser.add_argument('--missing-only', action='store_true', help='Only rows without a binary encoding')
+        parser.add_argument('--pending', action='store_true', help='Only registrations still waiting to be encoded')
+        parser.add_argument('--report', default='', help='Write a CSV of images that failed to encode')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.checkpoint = options['checkpoint']
+        batch_size = max(1, options['batch_size'])
+
+        start_after = saved = 0
+        if options['resume']:
+            state = self._read_checkpoint()
+            if state is None:
+                raise CommandError(f"No checkpoint found at {self.checkpoint}")
+            start_after, saved = state['last_id'], state['saved']
+            self.stdout.write(f"Resuming after FaceData #{start_after} ({state['saved']} already saved)")
+
+        rows = FaceData.objects.filter(pk__gt=start_after).order_by('pk')
+        if options['missing_only']:
+            rows = rows.filter(encoding__isnull=True)
+        if options['pending']:
+            rows = rows.filter(status='PENDING')
+        rows = list(rows.values_list(
+            'pk', 'face_image', 'student__enrollment_number', 'student__semester', 'status', 'student_id',
+        ))
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('Nothing to re-encode.'))
+            return
+
+        students = {pk: (enrollment, semester) for pk, _, enrollment, semester, _, _ in rows}
+        self.student_ids = {pk: student_id for pk, *_, student_id in rows}
+        pending_ids = {pk for pk, _, _, _, status, _ in rows if status == 'PENDING'}
+        opts = pipeline_options()
+        tasks, failures = [], []
+        for pk, name, enrollment, *_ in rows:
+            try:
+                tasks.append((pk, default_storage.path(name), opts))
+            except (NotImplementedError, ValueError) as e:
+                failures.append((pk, enrollment, name, f'Cannot resolve image path: {e}'))
+
+        workers = max(1, min(options['workers'], len(tasks) or 1))
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Re-encoding {len(rows)} faces with {workers} processes"
+            f"{' (dry run)' if self.dry_run else ''} ===\n"
+        ))
+
+        names = {pk: name for pk, name, *_ in rows}
+        self.names, self.students = names, students
+        self.replaced = 0
+        pending = []
+        done = encoded = 0
+        started = time.perf_counter()
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(workers, initializer=_warm_up) as pool:
+            # imap keeps input order, so every checkpoint marks a contiguous prefix as done.
+            chunksize = max(1, min(16, len(tasks) // (workers * 4) or 1))
+            for pk, blob, error, _ in pool.imap(encode_reference_file, tasks, chunksize=chunksize):
+                done += 1
+                if blob is None:
+                    failures.append((pk, students[pk][0], names[pk], error))
+                else:
+                    encoded += 1
+                    pending.append(FaceData(pk=pk, encoding=blob, encoding_json='', status='READY', status_message=''))
+                if len(pending) >= batch_size:
+                    saved += self._flush(pending, pk, saved)
+                    pending = []
+                if done % 100 == 0:
+                    rate = done / (time.perf_counter() - started)
+                    self.stdout.write(f"   {done}/{len(tasks)} encoded ({rate:.1f} img/s, {len(failures)} failed)")
+
+        if tasks:
+            saved += self._flush(pending, tasks[-1][0], saved)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"\nEncoded {done} images in {elapsed:.1f}s "
+            f"({done / elapsed if elapsed else 0:.1f} img/s); {len(failures)} failed."
+        )
+
+        if options['report']:
+            self._write_report(options['report'], failures)
+        elif failures:
+            for pk, enrollment, name, error in failures[:20]:
+                self.stdout.write(self.style.WARNING(f"   #{pk} {enrollment} {name}: {error}"))
+            if len(failures) > 20:
+                self.stdout.write(self.style.WARNING(f"   ... and {len(failures) - 20} more (use --report)"))
+
+        if self.dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {encoded} encodings would be saved.'))
+            return
+
+        # Waiting registrations that could not be encoded are reported back to the student.
+        for pk, _, name, error in failures:
+            if pk in pending_ids:
+                store_encoding_result(pk, name, None, error)
+
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        if self.replaced:
+            self.stdout.write(self.style.WARNING(f"   {self.replaced} photos were replaced during the run and kept as uploaded."))
+        self.stdout.write(self.style.SUCCESS(f'✅ Saved {saved} encodings.'))
+
+    def _flush(self, pending, last_id, saved):
+        if self.dry_run:
+            return 0
+        with transaction.atomic():
+            current = dict(
+                FaceData.objects.select_for_update().filter(pk__in=[face.pk for face in pending])
+                .values_list('pk', 'face_image')
+            )
+            # A photo re-uploaded since this run read it has its own encoding job; don't overwrite it.
+            fresh = [face for face in pending if current.get(face.pk) == self.names[face.pk]]
+            FaceData.objects.bulk_update(fresh, ['encoding', 'encoding_json', 'status', 'status_message'])
+        self.replaced += len(pending) - len(fresh)
+
+        # bulk_update bypasses the FaceData signals, so refresh the caches per batch.
+        bump_gallery_version(*(self.students[face.pk][1] for face in fresh))
+        record_face_changes([
+            (self.student_ids[face.pk], np.frombuffer(face.encoding, dtype=np.float32)) for face in fresh
+        ])
+        self._write_checkpoint({'last_id': last_id, 'saved': saved + len(fresh)})
+        return len(fresh)
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_checkpoint(self, state):
+        os.makedirs(os.path.dirname(self.checkpoint) or '.', exist_ok=True)
+        tmp = f'{self.checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+
+    def _write_report(self, path, failures):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['face_data_id', 'enrollment_number', 'image', 'error'])
+            writer.writerows(failures)
+        self.stdout.write(f"Failure report written to {path} ({len(failures)} rows)")
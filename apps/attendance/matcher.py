@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+import numpy as np
+
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.5
+
+FaceMatch = namedtuple('FaceMatch', ['student_id', 'name', 'distance'])
+
+
+class FaceGallery:
+    """
+    Known face encodings for a session, held as one contiguous float32 (N x 128)
+    matrix so a whole frame can be matched with a single matrix product.
+    """
+
+    def __init__(self, encodings, student_ids, names):
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self.student_ids = list(student_ids)
+        self.names = list(names)
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build from an iterable of (student_id, name, encoding) tuples."""
+        entries = list(entries)
+        if not entries:
+            return cls(np.empty((0, ENCODING_DIM), dtype=np.float32), [], [])
+        student_ids, names, encodings = zip(*entries)
+        return cls(np.stack([np.asarray(e, dtype=np.float32) for e in encodings]), student_ids, names)
+
+    def distances(self, unknown_encodings):
+        """Euclidean distance matrix of shape (faces, gallery)."""
+        unknown = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        sq = np.einsum('ij,ij->i', unknown, unknown)
+        d2 = sq[:, None] + self.sq_norms[None, :] - 2.0 * (unknown @ self.encodings.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    def match(self, unknown_encodings, tolerance=DEFAULT_TOLERANCE):
+        """
+        Assign each detected face to its nearest gallery student within tolerance.
+        Returns a list aligned with the input holding a FaceMatch or None.
+        A student can only appear once per frame, so when two faces resolve to
+        the same student the closer face keeps the match.
+        """
+        unknown = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        results = [None] * len(unknown)
+        if not len(self) or not len(unknown):
+            return results
+
+        dist = self.distances(unknown)
+        best = dist.argmin(axis=1)
+        best_dist = dist[np.arange(len(unknown)), best]
+
+        taken = set()
+        for face_idx in np.argsort(best_dist):
+            idx = int(best[face_idx])
+            distance = float(best_dist[face_idx])
+            if distance > tolerance or idx in taken:
+                continue
+            taken.add(idx)
+            results[face_idx] = FaceMatch(self.student_ids[idx], self.names[idx], distance)
+        return results
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+def backfill_encodings(apps, schema_editor):
+    FaceData = apps.get_model('attendance', 'FaceData')
+    pending = []
+    for fd in FaceData.objects.filter(encoding__isnull=True).exclude(encoding_json='').iterator(chunk_size=500):
+        try:
+            encoding = np.asarray(json.loads(fd.encoding_json), dtype=np.float32)
+        except (ValueError, TypeError):
+            continue
+        if encoding.shape != (128,):
+            continue
+        fd.encoding = encoding.tobytes()
+        pending.append(fd)
+        if len(pending) >= 500:
+            FaceData.objects.bulk_update(pending, ['encoding'])
+            pending = []
+    if pending:
+        FaceData.objects.bulk_update(pending, ['encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facedata',
+            name='encoding',
+            field=models.BinaryField(editable=False, max_length=512, null=True),
+        ),
+        migrations.AlterField(
+            model_name='facedata',
+            name='encoding_json',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(backfill_encodings, migrations.RunPython.noop),
+    ]
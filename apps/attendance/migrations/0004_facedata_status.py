@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_facedata_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facedata',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='READY', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='facedata',
+            name='status_message',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='facedata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:11
+
+import numpy as np
+from django.db import migrations, models
+
+
+def _pack(bits):
+    return np.packbits(bits, bitorder='little').tobytes()
+
+
+def _absent_runs(present, absent):
+    """(current, longest) absence run per row; as attendance.timeline.absent_runs, frozen for this migration."""
+    if absent.shape[1] == 0:
+        zeros = np.zeros(absent.shape[0], dtype=np.int64)
+        return zeros, zeros
+    absences = np.cumsum(absent, axis=1, dtype=np.int64)
+    runs = absences - np.maximum.accumulate(np.where(present, absences, 0), axis=1)
+    return runs[:, -1], runs.max(axis=1)
+
+
+def build_summaries(apps, schema_editor):
+    """
+    Build every summary row, counters and timelines, from the existing
+    records, as summary._rebuild_subject does. 0005 created the table empty
+    and every attendance page reads it, so an upgrade must not wait for a
+    manual rebuild_attendance_summary.
+    """
+    Subject = apps.get_model('subjects', 'Subject')
+    Student = apps.get_model('students', 'Student')
+    AttendanceSession = apps.get_model('attendance', 'AttendanceSession')
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    AttendanceSummary = apps.get_model('attendance', 'AttendanceSummary')
+
+    for subject in Subject.objects.only('id', 'semester').iterator():
+        sessions = list(AttendanceSession.objects.filter(subject=subject).order_by('date', 'id').only('id'))
+        for ordinal, session in enumerate(sessions):
+            session.ordinal = ordinal
+        AttendanceSession.objects.bulk_update(sessions, ['ordinal'], batch_size=500)
+        ordinals = {session.id: session.ordinal for session in sessions}
+        held = len(sessions)
+
+        rows = {sid: i for i, sid in enumerate(Student.objects.filter(semester=subject.semester).values_list('id', flat=True))}
+        marks = list(
+            AttendanceRecord.objects.filter(session__subject=subject)
+            .values_list('student_id', 'session_id', 'is_present').iterator(chunk_size=2000)
+        )
+        for sid, _, _ in marks:
+            rows.setdefault(sid, len(rows))
+        present = np.zeros((len(rows), held), dtype=bool)
+        absent = np.zeros((len(rows), held), dtype=bool)
+        for sid, session_id, is_present in marks:
+            (present if is_present else absent)[rows[sid], ordinals[session_id]] = True
+        current, longest = _absent_runs(present, absent)
+
+        AttendanceSummary.objects.filter(subject=subject).delete()
+        AttendanceSummary.objects.bulk_create(
+            [
+                AttendanceSummary(
+                    student_id=sid, subject=subject, sessions_held=held,
+                    present=int(present[i].sum()), absent=int(absent[i].sum()),
+                    current_streak=int(current[i]), max_absent_streak=int(longest[i]),
+                    present_bits=_pack(present[i]), absent_bits=_pack(absent[i]),
+                )
+                for sid, i in rows.items()
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_attendancesummary'),
+        ('students', '0008_alter_result_credits'),
+        ('subjects', '0002_alter_subject_options_subject_syllabus_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancesession',
+            name='ordinal',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendancesummary',
+            name='absent_bits',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='attendancesummary',
+            name='present_bits',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
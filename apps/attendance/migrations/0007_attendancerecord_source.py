@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_attendance_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='source',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_attendancerecord_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendancesession',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
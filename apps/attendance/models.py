@@ -1,26 +1,43 @@
 import numpy as np
 import json
 from django.db import models
+from django.utils import timezone
 from apps.students.models import Student
 from apps.subjects.models import Subject
 
+ENCODING_BYTES = 128 * 4  # 128-d float32
+
 class FaceData(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+    ]
+
     student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='face_data')
     face_image = models.ImageField(upload_to='face_datasets/') # Reference image
-    encoding_json = models.TextField() # Store numpy array as list
+    encoding_json = models.TextField(blank=True) # Legacy JSON list, superseded by `encoding`
+    encoding = models.BinaryField(max_length=ENCODING_BYTES, null=True, editable=False) # Raw float32 bytes
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='READY') # Encoding state of face_image
+    status_message = models.CharField(max_length=255, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def set_encoding(self, numpy_encoding):
-        self.encoding_json = json.dumps(numpy_encoding.tolist())
+        self.encoding = np.asarray(numpy_encoding, dtype=np.float32).tobytes()
+        self.encoding_json = ''
 
     def get_encoding(self):
-        return np.array(json.loads(self.encoding_json))
+        if self.encoding:
+            return np.frombuffer(self.encoding, dtype=np.float32)
+        return np.array(json.loads(self.encoding_json), dtype=np.float32)
 
 class AttendanceSession(models.Model):
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate) # Set explicitly by attendance imports
     status = models.BooleanField(default=True) # Session is active/closed
+    ordinal = models.PositiveIntegerField(default=0) # Position among the subject's sessions; indexes the timeline bits
     
     def __str__(self):
         return f"{self.subject.name} - {self.date}"
@@ -35,7 +52,27 @@ class AttendanceRecord(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     is_present = models.BooleanField(default=False)
     method = models.CharField(max_length=10, choices=METHOD_CHOICES, default='MANUAL')
+    source = models.CharField(max_length=32, blank=True) # Capture device that wrote the mark, for multi-camera sessions
     timestamp = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('session', 'student')
\ No newline at end of file
+        unique_together = ('session', 'student')
+
+class AttendanceSummary(models.Model):
+    """Running attendance totals per student and subject, kept in step with the records."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_summaries')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='attendance_summaries')
+    sessions_held = models.PositiveIntegerField(default=0)
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0) # Absent records; unmarked open sessions are not counted
+    current_streak = models.PositiveIntegerField(default=0) # Absences since the last present mark
+    max_absent_streak = models.PositiveIntegerField(default=0)
+    present_bits = models.BinaryField(default=b'') # Packed timeline by session ordinal, see attendance/timeline.py
+    absent_bits = models.BinaryField(default=b'')
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'subject')
+
+    def __str__(self):
+        return f"{self.student} - {self.subject}: {self.present}/{self.sessions_held}"
@@ -0,0 +1,96 @@
+import logging
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.attendance.encoder import encode_reference_file, pipeline_options, submit_background
+from apps.attendance.models import FaceData
+from apps.attendance.timing import record
+
+logger = logging.getLogger(__name__)
+
+
+def _user_message(error):
+    if error == 'No face detected':
+        return "No face detected. Try again."
+    if error.endswith('faces detected'):
+        return "Multiple faces detected. Upload a solo photo."
+    return "Could not read the photo. Please upload it again."
+
+
+def store_encoding_result(face_data_id, image_name, blob, error):
+    """
+    Save a finished encoding (or its failure) on the FaceData row.
+    Results for an image that has since been replaced are dropped, so a slow
+    job can never overwrite a newer upload.
+    """
+    with transaction.atomic():
+        face = FaceData.objects.select_for_update().filter(pk=face_data_id).first()
+        if face is None or face.face_image.name != image_name:
+            return
+        if blob is not None:
+            face.set_encoding(np.frombuffer(blob, dtype=np.float32))
+            face.status = 'READY'
+            face.status_message = ''
+        else:
+            # A previous encoding, if any, stays active until a good photo arrives.
+            face.status = 'FAILED'
+            face.status_message = _user_message(error)
+            logger.info(f"Face registration failed for student {face.student_id}: {error}")
+        face.save()
+
+
+def _on_encoded(future, face_data_id, image_name, submitted):
+    try:
+        _, blob, error, timings = future.result()
+    except Exception as e:
+        logger.error(f"Background face encoding crashed for FaceData {face_data_id}: {e}")
+        return  # left PENDING; requeue_if_stale retries it
+    started = time.perf_counter()
+    try:
+        store_encoding_result(face_data_id, image_name, blob, error)
+    except Exception as e:
+        logger.error(f"Could not save face encoding for FaceData {face_data_id}: {e}")
+    finally:
+        timings['queue'] = max(0.0, (started - submitted) * 1000 - sum(timings.values()))
+        timings['write'] = (time.perf_counter() - started) * 1000
+        timings['total'] = (time.perf_counter() - submitted) * 1000
+        record('register_background', timings)
+        connection.close()  # callbacks run on the pool's thread, outside any request
+
+
+def queue_face_encoding(face):
+    """Encode a PENDING FaceData in the background pool; the row is updated when done."""
+    image_name = face.face_image.name
+    task = (face.pk, face.face_image.path, pipeline_options())
+    if settings.FACE_ENCODER_WORKERS <= 0:
+        _, blob, error, _ = encode_reference_file(task)
+        store_encoding_result(face.pk, image_name, blob, error)
+        return
+    submitted = time.perf_counter()
+    future = submit_background(encode_reference_file, task)
+    future.add_done_callback(lambda f: _on_encoded(f, face.pk, image_name, submitted))
+
+
+def requeue_if_stale(face):
+    """
+    Re-submit a registration that has been pending for too long (its worker
+    was restarted or the job was lost). The conditional UPDATE makes sure
+    only one of several polling workers picks it up.
+    """
+    if face.status != 'PENDING':
+        return False
+    now = timezone.now()
+    if face.updated_at > now - timedelta(seconds=settings.FACE_REGISTRATION_STALE_AFTER):
+        return False
+    claimed = FaceData.objects.filter(
+        pk=face.pk, status='PENDING', updated_at=face.updated_at,
+    ).update(updated_at=now)
+    if claimed:
+        logger.warning(f"Re-queuing stale face registration for student {face.student_id}")
+        queue_face_encoding(face)
+    return bool(claimed)
@@ -0,0 +1,173 @@
+import logging
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from apps.students.models import Student
+from apps.attendance.models import AttendanceRecord, AttendanceSession, AttendanceSummary
+from apps.attendance.dedup import clear_session_state
+from apps.attendance.feed import session_sources, clear_sources
+from apps.attendance.summary import record_marks
+
+logger = logging.getLogger(__name__)
+
+PRESENT_TIMEOUT = 60 * 60 * 6
+UPSERT_BATCH_SIZE = 500
+
+
+def _present_key(session_id):
+    return f"attendance_present_{session_id}"
+
+
+def get_present_ids(session):
+    """Students already marked present in a session, kept in the shared cache."""
+    present = cache.get(_present_key(session.id))
+    if present is None:
+        present = set(
+            AttendanceRecord.objects.filter(session=session, is_present=True)
+            .values_list('student_id', flat=True)
+        )
+        cache.set(_present_key(session.id), present, timeout=PRESENT_TIMEOUT)
+    return present
+
+
+def forget_present(session_ids):
+    """Drop the cached present sets of sessions written outside mark_present; reseeded on next use."""
+    cache.delete_many([_present_key(session_id) for session_id in session_ids])
+
+
+def _remember_present(session, student_ids):
+    # Read-modify-write across workers can drop an ID; that only costs one
+    # extra existence check later, the DB stays the source of truth.
+    present = get_present_ids(session) | set(student_ids)
+    cache.set(_present_key(session.id), present, timeout=PRESENT_TIMEOUT)
+
+
+def _lock_session(session_id):
+    # Row lock on the session: concurrent writers (several cameras, manual
+    # marking) queue here instead of racing on unique_together(session, student).
+    list(AttendanceSession.objects.select_for_update().filter(pk=session_id).values_list('pk', flat=True))
+
+
+def upsert_attendance(session, statuses, method, source=''):
+    """
+    Apply {student_id: is_present} to a session with one bulk upsert.
+    Rows that already hold the requested value are left alone, so the diff is
+    exact even with several writers (cameras, manual marking): they queue on
+    the session row lock and each sees the previous one's rows.
+    Returns (created_ids, updated_ids).
+    """
+    if not statuses:
+        return set(), set()
+
+    with transaction.atomic():
+        _lock_session(session.id)
+        existing = dict(
+            AttendanceRecord.objects.filter(session=session, student_id__in=statuses.keys())
+            .values_list('student_id', 'is_present')
+        )
+        created = {sid for sid in statuses if sid not in existing}
+        updated = {sid for sid, present in statuses.items() if sid in existing and existing[sid] != present}
+        if not created and not updated:
+            return set(), set()
+
+        upsert_kwargs = {
+            'update_conflicts': True,
+            'update_fields': ['is_present', 'method', 'source', 'timestamp'],
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            upsert_kwargs['unique_fields'] = ['session', 'student']
+        AttendanceRecord.objects.bulk_create(
+            [
+                AttendanceRecord(
+                    session=session, student_id=sid, is_present=statuses[sid], method=method, source=source,
+                )
+                for sid in created | updated
+            ],
+            batch_size=UPSERT_BATCH_SIZE,
+            **upsert_kwargs,
+        )
+        record_marks(session, statuses, created, updated)
+    return created, updated
+
+
+def mark_present(session, student_ids, source=''):
+    """
+    Record face-recognition attendance for the given students in one write.
+    Students already known to be present are skipped without touching the DB;
+    an existing absent record is flipped to present.
+    Returns the set of student IDs that were newly marked present.
+    """
+    student_ids = set(student_ids) - get_present_ids(session)
+    if not student_ids:
+        return set()
+
+    created, updated = upsert_attendance(session, {sid: True for sid in student_ids}, method='FACE', source=source)
+    _remember_present(session, student_ids)
+    return created | updated
+
+
+def apply_roster(session, statuses):
+    """
+    Save a manual present/absent roster ({student_id: bool}) for a session.
+    Only rows that differ are written, in one bulk upsert under the session
+    lock, so it is safe alongside face recognition on the same session.
+    Returns (created_ids, updated_ids).
+    """
+    created, updated = upsert_attendance(session, statuses, method='MANUAL')
+    if created or updated:
+        # Reseeded from the DB on next use; patching it could race with the camera.
+        cache.delete(_present_key(session.id))
+        if not session.status:
+            refresh_attendance_percentages(created | updated)
+    return created, updated
+
+
+def refresh_attendance_percentages(student_ids):
+    """Recompute Student.attendance_percentage from the summaries (absents included) in one UPDATE batch."""
+    rows = (
+        AttendanceSummary.objects.filter(student_id__in=student_ids)
+        .values('student_id')
+        .annotate(total=Sum(F('present') + F('absent')), present_total=Sum('present'))
+    )
+    percentages = {
+        row['student_id']: round(row['present_total'] * 100.0 / row['total'], 2)
+        for row in rows if row['total']
+    }
+    students = [Student(id=sid, attendance_percentage=percentages.get(sid, 0.0)) for sid in student_ids]
+    Student.objects.bulk_update(students, ['attendance_percentage'], batch_size=UPSERT_BATCH_SIZE)
+
+
+def close_session(session):
+    """
+    Close a session in one transaction: every student of the subject's
+    semester without a record gets an absent record (a single INSERT),
+    attendance percentages are refreshed and the session's cache entries are
+    dropped. Safe to call again on a closed session.
+    Returns (present_count, absent_created).
+    """
+    with transaction.atomic():
+        _lock_session(session.id)
+        enrolled = list(
+            Student.objects.filter(semester=session.subject.semester).values_list('id', flat=True)
+        )
+        recorded = set(AttendanceRecord.objects.filter(session=session).values_list('student_id', flat=True))
+        absent = [
+            AttendanceRecord(session=session, student_id=sid, is_present=False, method='MANUAL')
+            for sid in enrolled if sid not in recorded
+        ]
+        AttendanceRecord.objects.bulk_create(absent, batch_size=UPSERT_BATCH_SIZE, ignore_conflicts=True)
+        absent_ids = {record.student_id for record in absent}
+        record_marks(session, dict.fromkeys(absent_ids, False), absent_ids, set())
+
+        AttendanceSession.objects.filter(pk=session.pk).update(status=False)
+        session.status = False
+        refresh_attendance_percentages(enrolled)
+        present_count = AttendanceRecord.objects.filter(session=session, is_present=True).count()
+
+    cache.delete(_present_key(session.id))
+    clear_session_state(session.id, session_sources(session.id))
+    clear_sources(session.id)
+    logger.info(f"Closed session {session.id}: {present_count} present, {len(absent)} marked absent")
+    return present_count, len(absent)
@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.students.models import Student
+from apps.attendance.models import FaceData, AttendanceSession
+from apps.attendance.gallery import bump_gallery_version
+from apps.attendance.campus_index import record_face_change
+from apps.attendance.summary import record_session_held, rebuild_attendance_summary
+
+
+def _on_face_commit(instance, encoding=None):
+    # The semester is read now: a student deleted with its face is gone by commit time.
+    student_id = instance.student_id
+    semester = Student.objects.filter(pk=student_id).values_list('semester', flat=True).first()
+
+    def face_changed():
+        bump_gallery_version(semester)
+        record_face_change(student_id, encoding)
+    transaction.on_commit(face_changed)
+
+
+@receiver(pre_save, sender=FaceData)
+def remember_face_encoding(sender, instance, update_fields=None, **kwargs):
+    instance._old_encoding = None
+    if instance.pk and (update_fields is None or 'encoding' in update_fields):
+        instance._old_encoding = FaceData.objects.filter(pk=instance.pk).values_list('encoding', flat=True).first()
+
+
+@receiver(post_save, sender=FaceData)
+def face_encoding_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Only saves that change the encoding invalidate the gallery and reach the index
+    # log (not status updates or the PENDING row of an async registration), and only
+    # once the transaction commits: a gallery rebuilt before that would read the old
+    # rows and cache them under the new version.
+    if update_fields is not None and 'encoding' not in update_fields:
+        return
+    new = bytes(instance.encoding) if instance.encoding else None
+    old = bytes(instance._old_encoding) if getattr(instance, '_old_encoding', None) else None
+    if new == old:
+        return
+    _on_face_commit(instance, None if new is None else instance.get_encoding().copy())
+
+
+@receiver(post_delete, sender=FaceData)
+def face_deleted(sender, instance, **kwargs):
+    _on_face_commit(instance)
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_placement(sender, instance, **kwargs):
+    instance._old_placement = None
+    if instance.pk:
+        instance._old_placement = Student.objects.filter(pk=instance.pk).values_list('semester', 'batch_id').first()
+
+
+@receiver(post_save, sender=Student)
+def invalidate_gallery_on_student_move(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_placement', None)
+    if created or old is None:
+        return
+    old_semester, old_batch_id = old
+    if old_semester != instance.semester or old_batch_id != instance.batch_id:
+        semester = instance.semester
+        transaction.on_commit(lambda: bump_gallery_version(old_semester, semester))
+
+
+@receiver(post_save, sender=AttendanceSession)
+def count_session_in_summary(sender, instance, created, **kwargs):
+    if created:
+        record_session_held(instance)
+
+
+class _PendingSummaryRebuild:
+    """One on_commit hook per transaction, rebuilding each subject that lost sessions once."""
+
+    def __init__(self):
+        self.subject_ids = set()
+
+    def __call__(self):
+        connection = transaction.get_connection()
+        if getattr(connection, '_pending_summary_rebuild', None) is self:
+            connection._pending_summary_rebuild = None
+        rebuild_attendance_summary(sorted(self.subject_ids))
+
+
+@receiver(post_delete, sender=AttendanceSession)
+def rebuild_summary_on_session_delete(sender, instance, **kwargs):
+    # After commit: when the whole subject is being deleted there is nothing left to rebuild.
+    # Deleting a subject or a queryset sends this per session, so the ids are collected first.
+    connection = transaction.get_connection()
+    pending = getattr(connection, '_pending_summary_rebuild', None)
+    # A hook dropped by a rolled-back transaction or savepoint is no longer queued.
+    if pending is not None and any(hook[1] is pending for hook in connection.run_on_commit):
+        pending.subject_ids.add(instance.subject_id)
+        return
+    pending = connection._pending_summary_rebuild = _PendingSummaryRebuild()
+    pending.subject_ids.add(instance.subject_id)
+    transaction.on_commit(pending)
@@ -0,0 +1,59 @@
+"""
+Longest absence streaks computed in the database.
+
+Gaps and islands: numbering a student's marks in one subject by session
+order, and separately numbering them within present/absent, gives a
+difference that is constant along each unbroken run of equal marks. Absent
+rows grouped by that difference are the absence runs; the longest run per
+student is the streak. Runs stay within one subject, matching the packed
+timelines. Needs window functions: MySQL 8+, SQLite 3.25+.
+
+Opt-in (ATTENDANCE_STREAK_BACKEND='sql'): benchmark_attendance_streaks has
+it slower than the per-record loop it was meant to replace, and far slower
+than the timelines, which stay the default.
+"""
+from django.db import connection
+
+from apps.attendance.models import AttendanceRecord, AttendanceSession
+
+STREAK_SQL = """
+SELECT student_id, MAX(run_length) FROM (
+    SELECT student_id, COUNT(*) AS run_length FROM (
+        SELECT r.student_id, s.subject_id, r.is_present,
+               ROW_NUMBER() OVER (PARTITION BY r.student_id, s.subject_id ORDER BY s.date, s.id)
+             - ROW_NUMBER() OVER (PARTITION BY r.student_id, s.subject_id, r.is_present ORDER BY s.date, s.id)
+               AS island
+        FROM {records} r
+        JOIN {sessions} s ON s.id = r.session_id
+        WHERE r.student_id IN ({placeholders})
+    ) marks
+    WHERE is_present = %s
+    GROUP BY student_id, subject_id, island
+) runs
+GROUP BY student_id
+"""
+
+
+def max_absent_streaks_sql(student_ids):
+    """
+    {student_id: longest run of consecutive absences in any one subject}.
+    One aggregate query (split only where the backend caps query parameters).
+    """
+    student_ids = list(student_ids)
+    streak_map = dict.fromkeys(student_ids, 0)
+    qn = connection.ops.quote_name
+    chunk_size = (connection.features.max_query_params or len(student_ids) + 1) - 1
+    with connection.cursor() as cursor:
+        for start in range(0, len(student_ids), max(chunk_size, 1)):
+            chunk = student_ids[start:start + chunk_size]
+            cursor.execute(
+                STREAK_SQL.format(
+                    records=qn(AttendanceRecord._meta.db_table),
+                    sessions=qn(AttendanceSession._meta.db_table),
+                    placeholders=', '.join(['%s'] * len(chunk)),
+                ),
+                [*chunk, False],
+            )
+            for student_id, longest in cursor.fetchall():
+                streak_map[student_id] = int(longest)
+    return streak_map
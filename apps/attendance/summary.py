@@ -0,0 +1,184 @@
+"""
+AttendanceSummary maintenance.
+
+Each summary row carries the student's packed timeline for the subject
+(see attendance/timeline.py). A write sets the bit at the session's ordinal
+and the counters (present, absent, streaks) are recomputed from the bits,
+so marks on any session, in any order, cost one read and one bulk update.
+Only a deleted session, which shifts the ordinals, needs a rebuild from
+the records.
+"""
+import logging
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.attendance.models import AttendanceRecord, AttendanceSession, AttendanceSummary
+from apps.attendance.timeline import pack, unpack, with_mark, timeline_totals
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+COUNTER_FIELDS = ['present', 'absent', 'current_streak', 'max_absent_streak']
+
+
+def _upsert_kwargs():
+    kwargs = {
+        'update_conflicts': True,
+        'update_fields': [
+            'sessions_held', *COUNTER_FIELDS, 'present_bits', 'absent_bits', 'last_updated',
+        ],
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['student', 'subject']
+    return kwargs
+
+
+def _refresh_counters(summaries):
+    """Set the counter fields of the given rows from their timelines."""
+    if not summaries:
+        return
+    totals = timeline_totals([s.present_bits for s in summaries], [s.absent_bits for s in summaries])
+    for summary, values in zip(summaries, zip(*totals)):
+        for field, value in zip(COUNTER_FIELDS, values):
+            setattr(summary, field, int(value))
+
+
+def record_session_held(session):
+    """Number a new session within its subject and count it as held on every summary row."""
+    subject = session.subject
+    # Counting earlier ids (not all rows) keeps ordinals unique when two sessions start together.
+    session.ordinal = AttendanceSession.objects.filter(subject=subject, id__lt=session.id).count()
+    AttendanceSession.objects.filter(pk=session.pk).update(ordinal=session.ordinal)
+    held = session.ordinal + 1
+
+    with transaction.atomic():
+        AttendanceSummary.objects.filter(subject=subject, sessions_held__lt=held).update(
+            sessions_held=held, last_updated=timezone.now(),
+        )
+        known = set(AttendanceSummary.objects.filter(subject=subject).values_list('student_id', flat=True))
+        AttendanceSummary.objects.bulk_create(
+            [
+                AttendanceSummary(student_id=sid, subject=subject, sessions_held=held)
+                for sid in Student.objects.filter(semester=subject.semester).values_list('id', flat=True)
+                if sid not in known
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def record_marks(session, statuses, created, updated):
+    """
+    Fold newly written records ({student_id: is_present}; created and
+    updated are the student IDs actually written) into the summaries.
+    Call inside the transaction that wrote them.
+    """
+    written = created | updated
+    if not written:
+        return
+
+    now = timezone.now()
+    summaries = list(
+        AttendanceSummary.objects.select_for_update()
+        .filter(subject_id=session.subject_id, student_id__in=written)
+    )
+    for summary in summaries:
+        summary.present_bits, summary.absent_bits = with_mark(
+            summary.present_bits, summary.absent_bits, session.ordinal, statuses[summary.student_id],
+        )
+        summary.sessions_held = max(summary.sessions_held, session.ordinal + 1)
+        summary.last_updated = now
+    _refresh_counters(summaries)
+    AttendanceSummary.objects.bulk_update(
+        summaries,
+        ['sessions_held', *COUNTER_FIELDS, 'present_bits', 'absent_bits', 'last_updated'],
+        batch_size=BATCH_SIZE,
+    )
+
+    missing = written - {summary.student_id for summary in summaries}
+    if missing:
+        # Marked before their row existed (joined mid-semester, or summaries never built).
+        rebuild_attendance_summary([session.subject_id], missing)
+
+
+def rebuild_attendance_summary(subject_ids=None, student_ids=None):
+    """
+    Recompute session ordinals and summary rows from the records. Limited to
+    the given subjects and/or students; with neither, every subject is
+    rebuilt. Returns the number of rows written.
+    """
+    subjects = Subject.objects.all()
+    if subject_ids is not None:
+        subjects = subjects.filter(id__in=subject_ids)
+    written = 0
+    for subject in subjects.only('id', 'semester'):
+        written += _rebuild_subject(subject, student_ids)
+    return written
+
+
+def _renumber_sessions(subject):
+    sessions = list(AttendanceSession.objects.filter(subject=subject).order_by('date', 'id').only('id', 'ordinal'))
+    moved = []
+    for ordinal, session in enumerate(sessions):
+        if session.ordinal != ordinal:
+            session.ordinal = ordinal
+            moved.append(session)
+    AttendanceSession.objects.bulk_update(moved, ['ordinal'], batch_size=BATCH_SIZE)
+    return {session.id: session.ordinal for session in sessions}
+
+
+def _rebuild_subject(subject, student_ids):
+    with transaction.atomic():
+        ordinals = _renumber_sessions(subject)
+        held = len(ordinals)
+        records = AttendanceRecord.objects.filter(session__subject=subject)
+        enrolled = Student.objects.filter(semester=subject.semester)
+        if student_ids is not None:
+            records = records.filter(student_id__in=student_ids)
+            enrolled = enrolled.filter(id__in=student_ids)
+
+        rows = {sid: i for i, sid in enumerate(enrolled.values_list('id', flat=True))}
+        marks = list(records.values_list('student_id', 'session_id', 'is_present').iterator(chunk_size=2000))
+        for sid, _, _ in marks:
+            rows.setdefault(sid, len(rows))
+        present = np.zeros((len(rows), held), dtype=bool)
+        absent = np.zeros((len(rows), held), dtype=bool)
+        for sid, session_id, is_present in marks:
+            (present if is_present else absent)[rows[sid], ordinals[session_id]] = True
+
+        summaries = [
+            AttendanceSummary(
+                student_id=sid, subject=subject, sessions_held=held,
+                present_bits=pack(present[i]), absent_bits=pack(absent[i]),
+            )
+            for sid, i in rows.items()
+        ]
+        _refresh_counters(summaries)
+
+        if student_ids is None:
+            AttendanceSummary.objects.filter(subject=subject).exclude(student_id__in=rows.keys()).delete()
+        AttendanceSummary.objects.bulk_create(summaries, batch_size=BATCH_SIZE, **_upsert_kwargs())
+    return len(summaries)
+
+
+def subject_timelines(student_ids):
+    """(student_ids, sessions_held, present matrix, absent matrix) for every summary row of the students."""
+    rows = list(
+        AttendanceSummary.objects.filter(student_id__in=student_ids)
+        .values_list('student_id', 'sessions_held', 'present_bits', 'absent_bits')
+    )
+    if not rows:
+        empty = np.zeros((0, 0), dtype=bool)
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), empty, empty
+    sids, held, present_bits, absent_bits = zip(*rows)
+    width = int(max(held))
+    return (
+        np.array(sids, dtype=np.int64),
+        np.array(held, dtype=np.int64),
+        unpack(present_bits, width),
+        unpack(absent_bits, width),
+    )
@@ -0,0 +1,52 @@
+"""
+Synthetic 128-d face encodings for offline benchmarks (no camera, no dlib).
+
+Identities are drawn around a handful of group means so the gallery has the
+loose cluster structure of real encodings: about 0.9 apart across groups,
+0.7 within a group, and about 0.35 between two captures of the same person.
+"""
+import numpy as np
+
+from apps.attendance.matcher import ENCODING_DIM
+
+GROUPS = 32
+GROUP_SPREAD = 0.035
+IDENTITY_SPREAD = 0.045
+CAPTURE_NOISE = 0.022
+
+
+class SyntheticFaces:
+    """
+    A population of `count` registered identities with one gallery capture
+    each. Impostors in the queries come from the same population groups, so
+    they are as close to the gallery as real unregistered visitors would be.
+    """
+
+    def __init__(self, count, seed=0):
+        self.rng = np.random.default_rng(seed)
+        base = self.rng.normal(0.0, 0.09, ENCODING_DIM)
+        self.groups = base + self.rng.normal(0.0, GROUP_SPREAD, (GROUPS, ENCODING_DIM))
+        self.centers = self._identities(count)
+        self.ids = np.arange(count, dtype=np.int64)
+        self.gallery = self.capture(self.centers)
+
+    def _identities(self, count):
+        picked = self.groups[self.rng.integers(0, GROUPS, count)]
+        return (picked + self.rng.normal(0.0, IDENTITY_SPREAD, (count, ENCODING_DIM))).astype(np.float32)
+
+    def capture(self, centers, noise=CAPTURE_NOISE):
+        """One noisy capture (registration photo or camera frame) per center."""
+        return (centers + self.rng.normal(0.0, noise, centers.shape)).astype(np.float32)
+
+    def queries(self, count, impostor_rate=0.1):
+        """
+        Camera-frame encodings: mostly captures of registered identities, plus
+        a share of unregistered people. Returns (queries, true ids, -1 for impostors).
+        """
+        truth = self.rng.integers(0, len(self.centers), count)
+        queries = self.capture(self.centers[truth])
+        impostors = self.rng.random(count) < impostor_rate
+        if impostors.any():
+            queries[impostors] = self.capture(self._identities(int(impostors.sum())))
+            truth[impostors] = -1
+        return queries, truth
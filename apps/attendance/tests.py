@@ -1,3 +1,619 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+from importlib import import_module
+import tempfile
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from unittest import mock
+from PIL import Image
+
+from apps.accounts.models import User
+from apps.faculty.models import Faculty
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.attendance.ann import FaceIndex, LOG_FILE, LOG_RECORD
+from apps.attendance.matcher import FaceGallery
+from apps.attendance.management.commands.reencode_faces import Command as ReencodeCommand
+from apps.attendance import gallery, importer
+from apps.attendance.models import AttendanceRecord, AttendanceSession, AttendanceSummary, FaceData
+from apps.attendance.services import apply_roster, close_session, mark_present
+from apps.attendance.streaks import max_absent_streaks_sql
+from apps.attendance.summary import rebuild_attendance_summary
+from apps.ml.views import _calculate_max_absent_streaks, _timeline_stats
+
+
+def make_faculty(username):
+    user = User.objects.create_user(username=username, email=f"{username}@test.invalid", password='x', role=User.Role.FACULTY)
+    return Faculty.objects.create(user=user, employee_id=username, initials=username[:5].upper())
+
+
+def make_students(count, semester, prefix='st'):
+    students = []
+    for i in range(count):
+        user = User.objects.create_user(
+            username=f"{prefix}{semester}_{i}", email=f"{prefix}{semester}_{i}@test.invalid", password='x',
+            first_name=f"Student{i}",
+        )
+        students.append(Student.objects.create(user=user, enrollment_number=f"{prefix.upper()}{semester}{i:03d}", semester=semester))
+    return students
+
+
+# Present sets and dedup state live in the cache; keep them per test, not in the shared file cache.
+@override_settings(
+    CACHE_BACKEND='locmem',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'attendance-tests'}},
+)
+class AttendanceTestCase(TestCase):
+    semester = 5
+
+    def setUp(self):
+        cache.clear()
+        self.faculty = make_faculty('fac1')
+        self.subject = Subject.objects.create(name='Python', code='PY5', semester=self.semester, faculty=self.faculty)
+        self.students = make_students(4, self.semester)
+        self.session = AttendanceSession.objects.create(subject=self.subject)
+
+
+class FaceGalleryMatchTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.known = rng.normal(size=(3, 128)).astype(np.float32)
+        self.gallery = FaceGallery(self.known, [11, 12, 13], ['A', 'B', 'C'])
+
+    def _near(self, index, distance):
+        offset = np.zeros(128, dtype=np.float32)
+        offset[0] = distance
+        return self.known[index] + offset
+
+    def test_nearest_match_wins_over_first_within_tolerance(self):
+        # Both entries are within tolerance; the first one listed is further away.
+        gallery = FaceGallery([self.known[0] + 0.03, self.known[0]], [21, 22], ['first', 'nearest'])
+        match, = gallery.match([self._near(0, 0.01)], tolerance=0.5)
+        self.assertEqual(match.student_id, 22)
+        self.assertAlmostEqual(match.distance, 0.01, places=2)
+
+    def test_rejects_matches_over_tolerance(self):
+        matches = self.gallery.match([self._near(0, 0.4), self._near(1, 0.6)], tolerance=0.5)
+        self.assertEqual(matches[0].student_id, 11)
+        self.assertIsNone(matches[1])
+
+    def test_one_student_per_frame(self):
+        matches = self.gallery.match([self._near(2, 0.3), self._near(2, 0.1), self._near(1, 0.2)])
+        self.assertEqual([m and m.student_id for m in matches], [None, 13, 12])
+
+    def test_empty_gallery_or_frame(self):
+        empty = FaceGallery.from_entries([])
+        self.assertEqual(empty.match([self.known[0]]), [None])
+        self.assertEqual(self.gallery.match(np.empty((0, 128))), [])
+
+
+class FaceEncodingStorageTests(AttendanceTestCase):
+
+    def test_float32_round_trip(self):
+        encoding = np.random.default_rng(1).normal(size=128)
+        face = FaceData(student=self.students[0], face_image='face_datasets/a.jpg')
+        face.set_encoding(encoding)
+        face.save()
+        face = FaceData.objects.get(pk=face.pk)
+        self.assertEqual(len(face.encoding), 128 * 4)
+        self.assertEqual(face.get_encoding().dtype, np.float32)
+        self.assertTrue(np.allclose(face.get_encoding(), encoding, atol=1e-6))
+
+    def test_backfill_converts_json_encodings(self):
+        backfill = import_module('apps.attendance.migrations.0003_facedata_encoding').backfill_encodings
+        encoding = np.random.default_rng(2).normal(size=128)
+        legacy = FaceData.objects.create(
+            student=self.students[0], face_image='face_datasets/a.jpg', encoding_json=json.dumps(encoding.tolist()),
+        )
+        broken = FaceData.objects.create(student=self.students[1], face_image='face_datasets/b.jpg', encoding_json='[1, 2]')
+
+        backfill(apps, None)
+        legacy.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertTrue(np.allclose(np.frombuffer(legacy.encoding, dtype=np.float32), encoding, atol=1e-6))
+        self.assertIsNone(broken.encoding)
+
+
+class SessionPermissionTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = make_faculty('fac2')
+        self.admin = User.objects.create_user(username='adm', email='adm@test.invalid', password='x', role=User.Role.ADMIN)
+
+    def test_owner_can_read_roster(self):
+        self.client.force_login(self.faculty.user)
+        response = self.client.get(reverse('session_roster', args=[self.session.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['students']), 4)
+
+    def test_other_faculty_is_refused(self):
+        self.client.force_login(self.other.user)
+        self.assertEqual(self.client.get(reverse('session_roster', args=[self.session.id])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('session_feed', args=[self.session.id])).status_code, 403)
+        self.client.post(reverse('close_session', args=[self.session.id]))
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.status)
+
+    def test_admin_without_faculty_profile(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('session_roster', args=[self.session.id])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('session_feed', args=[self.session.id])).status_code, 200)
+        response = self.client.post(reverse('close_session', args=[self.session.id]))
+        self.assertEqual(response.status_code, 302)
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.status)
+
+    def _post_roster(self, statuses):
+        return self.client.post(
+            reverse('session_roster', args=[self.session.id]),
+            json.dumps({'statuses': statuses}), content_type='application/json',
+        )
+
+    def test_roster_post_writes_only_changes(self):
+        self.client.force_login(self.faculty.user)
+        first, second = self.students[:2]
+        response = self._post_roster({first.id: True, second.id: False})
+        self.assertEqual(response.json(), {'status': 'success', 'created': 2, 'updated': 0, 'unchanged': 0})
+        response = self._post_roster({first.id: True, second.id: True})
+        self.assertEqual(response.json(), {'status': 'success', 'created': 0, 'updated': 1, 'unchanged': 1})
+        marks = dict(AttendanceRecord.objects.filter(session=self.session).values_list('student_id', 'is_present'))
+        self.assertEqual(marks, {first.id: True, second.id: True})
+
+    def test_roster_post_rejects_bad_input(self):
+        self.client.force_login(self.faculty.user)
+        outsider = make_students(1, self.semester + 1)[0]
+        response = self._post_roster({outsider.id: True})
+        self.assertEqual((response.status_code, response.json()['unknown']), (400, [outsider.id]))
+        response = self.client.post(reverse('session_roster', args=[self.session.id]), 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.other.user)
+        self.assertEqual(self._post_roster({self.students[0].id: True}).status_code, 403)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+
+class MarkPresentTests(AttendanceTestCase):
+
+    def test_repeated_marks_write_once(self):
+        ids = [s.id for s in self.students[:2]]
+        self.assertEqual(mark_present(self.session, ids), set(ids))
+        self.assertEqual(mark_present(self.session, ids), set())
+        cache.clear()  # Present set is reseeded from the records
+        self.assertEqual(mark_present(self.session, ids), set())
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 2)
+
+    def test_absent_record_is_flipped(self):
+        student = self.students[0]
+        apply_roster(self.session, {student.id: False})
+        self.assertEqual(mark_present(self.session, [student.id]), {student.id})
+        record = AttendanceRecord.objects.get(session=self.session, student=student)
+        self.assertTrue(record.is_present)
+        self.assertEqual(record.method, 'FACE')
+
+
+class CloseSessionTests(AttendanceTestCase):
+
+    def test_fills_absentees_once(self):
+        mark_present(self.session, [self.students[0].id])
+        present, absent = close_session(self.session)
+        self.assertEqual((present, absent), (1, 3))
+        marks = dict(AttendanceRecord.objects.filter(session=self.session).values_list('student_id', 'is_present'))
+        self.assertEqual(marks, {s.id: s == self.students[0] for s in self.students})
+
+        self.assertEqual(close_session(self.session), (1, 0))
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 4)
+
+    def test_updates_percentages(self):
+        mark_present(self.session, [self.students[0].id])
+        close_session(self.session)
+        self.students[0].refresh_from_db()
+        self.students[1].refresh_from_db()
+        self.assertEqual(self.students[0].attendance_percentage, 100.0)
+        self.assertEqual(self.students[1].attendance_percentage, 0.0)
+
+
+class CampusIndexLogTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir, ignore_errors=True)
+        overrides = self.settings(FACE_INDEX_DIR=self.index_dir, FACE_INDEX_COMPACT_AFTER=1000)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.log_path = os.path.join(self.index_dir, LOG_FILE)
+
+    def _records(self):
+        return _log_records(self.log_path)
+
+    def _face(self, student, seed=0):
+        face = FaceData(student=student, face_image='face_datasets/x.jpg')
+        face.set_encoding(np.random.default_rng(seed).normal(size=128))
+        return face
+
+    def test_only_encoding_changes_are_logged_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            face = self._face(self.students[0])
+            face.save()
+        self.assertEqual(self._records(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            face.status = 'READY'
+            face.status_message = 'ok'
+            face.save()
+            face.save(update_fields=['status'])
+        self.assertEqual(self._records(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceData.objects.create(student=self.students[1], face_image='face_datasets/y.jpg', status='PENDING')
+        self.assertEqual(self._records(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            face.set_encoding(np.ones(128))
+            face.save()
+        self.assertEqual(self._records(), 2)
+
+    def test_rolled_back_change_is_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self._face(self.students[0]).save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self._records(), 0)
+
+    def test_log_is_compacted_into_snapshot(self):
+        with self.settings(FACE_INDEX_COMPACT_AFTER=3), self.captureOnCommitCallbacks(execute=True):
+            for i, student in enumerate(self.students[:3]):
+                self._face(student, seed=i).save()
+        self.assertEqual(self._records(), 0)
+        index = FaceIndex.load(self.index_dir)
+        self.assertEqual(sorted(index.ids.tolist()), sorted(s.id for s in self.students[:3]))
+    def test_reencode_batch_skips_replaced_photos(self):
+        faces = [FaceData.objects.create(student=s, face_image=f'face_datasets/{i}.jpg', status='PENDING')
+                 for i, s in enumerate(self.students[:2])]
+        command = ReencodeCommand()
+        command.dry_run = False
+        command.checkpoint = os.path.join(self.index_dir, 'checkpoint.json')
+        command.names = {face.pk: face.face_image.name for face in faces}
+        command.students = {face.pk: (face.student.enrollment_number, self.semester) for face in faces}
+        command.student_ids = {face.pk: face.student_id for face in faces}
+        command.replaced = 0
+        FaceData.objects.filter(pk=faces[1].pk).update(face_image='face_datasets/new.jpg')
+
+        blob = np.ones(128, dtype=np.float32).tobytes()
+        pending = [FaceData(pk=face.pk, encoding=blob, encoding_json='', status='READY', status_message='') for face in faces]
+        self.assertEqual(command._flush(pending, faces[1].pk, 0), 1)
+        self.assertEqual(command.replaced, 1)
+        self.assertEqual(dict(FaceData.objects.values_list('pk', 'status')), {faces[0].pk: 'READY', faces[1].pk: 'PENDING'})
+        self.assertEqual(self._records(), 1)
+
+
+class GalleryInvalidationTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        gallery._galleries.clear()
+        self.addCleanup(gallery._galleries.clear)
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir, ignore_errors=True)
+        overrides = self.settings(FACE_INDEX_DIR=self.index_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _gallery_ids(self):
+        return gallery.get_semester_gallery(self.semester).student_ids
+
+    def test_committed_encoding_change_gives_fresh_gallery(self):
+        first, second = self.students[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            face = FaceData(student=first, face_image='face_datasets/a.jpg')
+            face.set_encoding(np.zeros(128))
+            face.save()
+        self.assertEqual(self._gallery_ids(), [first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new = FaceData(student=second, face_image='face_datasets/b.jpg')
+            new.set_encoding(np.ones(128))
+            new.save()
+            # A worker rebuilding before the commit still sees the old version.
+            self.assertEqual(self._gallery_ids(), [first.id])
+        self.assertEqual(sorted(self._gallery_ids()), [first.id, second.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new.delete()
+        self.assertEqual(self._gallery_ids(), [first.id])
+
+    def test_saves_without_encoding_change_keep_the_version(self):
+        version = gallery.get_gallery_version(self.semester)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            face = FaceData.objects.create(student=self.students[0], face_image='face_datasets/a.jpg', status='PENDING')
+            face.status_message = 'queued'
+            face.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(gallery.get_gallery_version(self.semester), version)
+
+
+class RegisterExportTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='adm', email='adm@test.invalid', password='x', role=User.Role.ADMIN)
+        self.second = AttendanceSession.objects.create(subject=self.subject, date=self.session.date + timedelta(days=1))
+        first, second = self.students[:2]
+        apply_roster(self.session, {first.id: True, second.id: False})
+        apply_roster(self.second, {first.id: True})
+        first.user.first_name = '=HYPERLINK("http://x")'
+        first.user.save()
+
+    def _export(self, **params):
+        response = self.client.get(reverse('export_attendance_register'), params)
+        return response, list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_csv_register(self):
+        self.client.force_login(self.admin)
+        response, rows = self._export(subject=self.subject.id)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, *students, footer = rows
+        self.assertEqual(header, ['Enrollment No', 'Name', str(self.session.date), str(self.second.date), 'Present', 'Absent', 'Attendance %'])
+        self.assertEqual(len(students), 4)
+        self.assertEqual(students[0], [self.students[0].enrollment_number, '\'=HYPERLINK("http://x")', 'P', 'P', '2', '0', '100.0'])
+        self.assertEqual(students[1][2:], ['A', '', '0', '1', '0.0'])
+        self.assertEqual(students[2][2:], ['', '', '0', '0', '0.0'])
+        self.assertEqual(footer, ['', 'Present', '1', '1', '', '', ''])
+
+    def test_semester_register_as_spreadsheet(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_attendance_register'), {'semester': self.semester, 'format': 'xls'})
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'PY5 {self.session.date}', body)
+        self.assertEqual(body.count('<Row>'), 6)
+
+    def test_admin_only(self):
+        self.client.force_login(self.faculty.user)
+        response = self.client.get(reverse('export_attendance_register'), {'subject': self.subject.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')))
+
+
+def make_frame(seed):
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(48, 64), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'L').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@override_settings(FACE_FRAME_DEDUP_THRESHOLD=4, FACE_FRAME_DEDUP_MAX_AGE=30)
+class BatchRecognitionTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        gallery._galleries.clear()
+        self.addCleanup(gallery._galleries.clear)
+        rng = np.random.default_rng(3)
+        self.encodings = {}
+        for student in self.students[:3]:
+            face = FaceData(student=student, face_image=f'face_datasets/{student.id}.jpg')
+            face.set_encoding(rng.normal(size=128))
+            face.save()
+            self.encodings[student.id] = face.get_encoding()
+        self.frames = [make_frame(seed) for seed in range(3)]
+        self.admin = User.objects.create_user(username='adm', email='adm@test.invalid', password='x', role=User.Role.ADMIN)
+        self.client.force_login(self.faculty.user)
+
+    def _post(self, frame_faces, mocked):
+        """frame_faces: one list of student indexes per frame; the encoder is mocked to find those faces."""
+        faces = {frame: [self.encodings[self.students[i].id] + 0.01 for i in indexes]
+                 for frame, indexes in zip(self.frames, frame_faces)}
+        mocked.side_effect = lambda timer, fn, frames, options: [faces[frame] for frame in frames]
+        images = [SimpleUploadedFile(f'f{i}.png', self.frames[i], 'image/png') for i in range(len(frame_faces))]
+        return self.client.post(reverse('recognize_batch', args=[self.session.id]), {'images': images}).json()
+
+    def _dedup_stats(self):
+        self.client.force_login(self.admin)
+        return self.client.get(reverse('attendance_dedup_stats')).json()
+
+    def test_students_in_several_frames_are_marked_once(self):
+        with mock.patch('apps.attendance.views.run_encoder_timed') as encoder:
+            response = self._post([[0, 1], [0, 2], []], encoder)
+        self.assertEqual((response['status'], response['frames']), ('success', 3))
+        self.assertEqual(len(response['identified']), 3)
+        marked = AttendanceRecord.objects.filter(session=self.session, is_present=True)
+        self.assertEqual(sorted(marked.values_list('student_id', flat=True)), sorted(s.id for s in self.students[:3]))
+
+    def test_repeated_frame_is_skipped(self):
+        with mock.patch('apps.attendance.views.run_encoder_timed') as encoder:
+            self._post([[0]], encoder)
+            response = self._post([[0]], encoder)
+        self.assertTrue(response['duplicate'])
+        self.assertEqual(response['identified'], [f"{self.students[0].user.first_name} (Already Marked)"])
+        self.assertEqual(encoder.call_count, 1)
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 1)
+        stats = self._dedup_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class AttendanceImportTests(AttendanceTestCase):
+
+    def _import(self, *rows):
+        lines = ['Enrollment_Number,subject_code,date,status', *(','.join(row) for row in rows)]
+        return importer.import_attendance_csv(line + '\n' for line in lines)
+
+    def test_row_errors_are_reported_and_skipped(self):
+        first = self.students[0].enrollment_number
+        result = self._import(
+            (first, 'PY5', '2025-01-06', 'P'),
+            ('NOBODY', 'PY5', '2025-01-06', 'P'),
+            (first, 'NOPE', '2025-01-06', 'P'),
+            (first, 'PY5', '2025-13-01', 'P'),
+            (first, 'PY5', '2025-01-06', 'maybe'),
+        )
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6])
+        self.assertIsNone(result.failed)
+        self.assertEqual(AttendanceRecord.objects.filter(student=self.students[0], is_present=True).count(), 1)
+
+    def test_duplicate_rows_keep_the_last_mark(self):
+        first = self.students[0].enrollment_number
+        result = self._import((first, 'PY5', '06-01-2025', 'P'), (first, 'PY5', '2025-01-06', 'A'))
+        self.assertEqual((result.created, result.updated, result.sessions_created), (1, 0, 1))
+        record = AttendanceRecord.objects.get(student=self.students[0], session__date='2025-01-06')
+        self.assertFalse(record.is_present)
+
+        again = self._import((first, 'PY5', '2025-01-06', 'A'))
+        self.assertEqual((again.created, again.updated, again.unchanged), (0, 0, 1))
+
+    def test_import_into_existing_session_and_summaries(self):
+        rows = [(s.enrollment_number, 'PY5', str(self.session.date), 'P' if i % 2 else 'A') for i, s in enumerate(self.students)]
+        result = self._import(*rows)
+        self.assertEqual(result.sessions_created, 0)
+        summary = AttendanceSummary.objects.get(student=self.students[1], subject=self.subject)
+        self.assertEqual((summary.present, summary.absent), (1, 0))
+        self.students[0].refresh_from_db()
+        self.assertEqual(self.students[0].attendance_percentage, 0.0)
+
+    def test_failed_chunk_keeps_committed_rows_consistent(self):
+        write_chunk = importer._write_chunk
+        calls = []
+
+        def fail_second(*args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            write_chunk(*args)
+
+        rows = [(s.enrollment_number, 'PY5', '2025-01-06', 'P') for s in self.students]
+        with mock.patch.object(importer, 'CHUNK_ROWS', 2), mock.patch.object(importer, '_write_chunk', fail_second):
+            result = self._import(*rows)
+        self.assertEqual(result.imported, 2)
+        self.assertIn('disk full', result.failed)
+        for student in self.students[:2]:
+            summary = AttendanceSummary.objects.get(student=student, subject=self.subject)
+            self.assertEqual(summary.present, 1)
+            student.refresh_from_db()
+            self.assertEqual(student.attendance_percentage, 100.0)
+
+
+
+class SummaryRebuildTests(AttendanceTestCase):
+    fields = ('sessions_held', 'present', 'absent', 'current_streak', 'max_absent_streak', 'present_bits', 'absent_bits')
+
+    def _summaries(self):
+        return {
+            row[0]: row[1:]
+            for row in AttendanceSummary.objects.filter(subject=self.subject).values_list('student_id', *self.fields)
+        }
+
+    def test_live_updates_match_rebuild(self):
+        first, second = self.students[:2]
+        mark_present(self.session, [first.id])
+        close_session(self.session)
+        for day in range(1, 4):
+            # Live ordinals follow creation order; rebuilds order by date, as sessions are held.
+            session = AttendanceSession.objects.create(subject=self.subject, date=self.session.date + timedelta(days=day))
+            mark_present(session, [second.id])
+            apply_roster(session, {first.id: day == 3})
+            close_session(session)
+
+        live = self._summaries()
+        rebuild_attendance_summary([self.subject.id])
+        self.assertEqual(self._summaries(), live)
+
+        for student in self.students:
+            records = AttendanceRecord.objects.filter(student=student, session__subject=self.subject)
+            summary = AttendanceSummary.objects.get(student=student, subject=self.subject)
+            self.assertEqual(summary.sessions_held, 4)
+            self.assertEqual(summary.present, records.filter(is_present=True).count())
+            self.assertEqual(summary.absent, records.filter(is_present=False).count())
+        self.assertEqual(live[first.id][:5], (4, 2, 2, 0, 2))
+
+    def test_migration_builds_summaries_from_records(self):
+        build_summaries = import_module('apps.attendance.migrations.0006_attendance_timeline').build_summaries
+        mark_present(self.session, [self.students[0].id])
+        close_session(self.session)
+        AttendanceSession.objects.create(subject=self.subject, date=self.session.date + timedelta(days=1))
+        live = self._summaries()
+
+        AttendanceSummary.objects.all().delete()
+        build_summaries(apps, None)
+        self.assertEqual(self._summaries(), live)
+
+
+class SessionDeleteRebuildTests(AttendanceTestCase):
+
+    def test_each_subject_is_rebuilt_once_per_transaction(self):
+        other = Subject.objects.create(name='Networks', code='CN5', semester=self.semester)
+        for subject in (self.subject, self.subject, other, other):
+            AttendanceSession.objects.create(subject=subject)
+
+        with mock.patch('apps.attendance.signals.rebuild_attendance_summary') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                AttendanceSession.objects.all().delete()
+        rebuild.assert_called_once_with(sorted([self.subject.id, other.id]))
+
+        AttendanceSession.objects.create(subject=other)
+        other_id = other.id
+        with mock.patch('apps.attendance.signals.rebuild_attendance_summary') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        self.subject.delete()
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                other.delete()
+        rebuild.assert_called_once_with([other_id])
+
+
+class AbsenceStreakTests(AttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        other = Subject.objects.create(name='Networks', code='CN5', semester=self.semester)
+        rng = np.random.default_rng(7)
+        records = []
+        for subject in (self.subject, other):
+            for day in range(12):
+                session = AttendanceSession.objects.create(subject=subject, date=date(2025, 1, 6) + timedelta(days=day), status=False)
+                for student in self.students:
+                    mark = rng.integers(3)  # present, absent, or unmarked
+                    if mark < 2:
+                        records.append(AttendanceRecord(session=session, student=student, is_present=not mark))
+        AttendanceRecord.objects.bulk_create(records)
+        rebuild_attendance_summary()
+        self.student_ids = [s.id for s in self.students]
+
+    def test_sql_matches_timelines(self):
+        streaks, recent = _timeline_stats(self.student_ids)
+        self.assertTrue(any(streaks.values()))
+        self.assertEqual(max_absent_streaks_sql(self.student_ids), streaks)
+        self.assertEqual(_timeline_stats(self.student_ids, streaks=False), (None, recent))
+
+    def test_sql_backend_only_when_chosen(self):
+        with self.settings(ATTENDANCE_STREAK_BACKEND='timeline'), mock.patch('apps.ml.views.max_absent_streaks_sql') as sql:
+            streaks = _calculate_max_absent_streaks(self.student_ids)
+        sql.assert_not_called()
+        with self.settings(ATTENDANCE_STREAK_BACKEND='sql'), mock.patch('apps.ml.views.max_absent_streaks_sql', return_value=streaks) as sql:
+            self.assertEqual(_calculate_max_absent_streaks(self.student_ids), streaks)
+        sql.assert_called_once()
+
+
+def _log_records(path):
+    try:
+        return os.path.getsize(path) // LOG_RECORD.size
+    except FileNotFoundError:
+        return 0
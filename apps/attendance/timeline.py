@@ -0,0 +1,73 @@
+"""
+Packed attendance timelines.
+
+A student's attendance in one subject is two bit arrays indexed by session
+ordinal (AttendanceSession.ordinal): one bit set per present mark, one per
+absent mark. A session with neither bit set has no record for the student
+yet (still open, or never marked) and is skipped by streaks, like a missing
+record. Bits are little-endian within each byte, so ordinal i is bit i % 8
+of byte i // 8.
+
+The functions below work on many timelines at once: the blobs are unpacked
+into a boolean matrix with one row per timeline, and counts, streaks and
+rolling windows are column-wise numpy operations, with no per-record loop.
+"""
+import numpy as np
+
+
+def pack(bits):
+    return np.packbits(np.asarray(bits, dtype=bool), bitorder='little').tobytes()
+
+
+def unpack(blobs, width=None):
+    """Stack timelines into a (len(blobs), width) boolean matrix, zero-padded."""
+    blobs = [bytes(blob or b'') for blob in blobs]
+    nbytes = max([len(blob) for blob in blobs] + [0])
+    if width is not None:
+        nbytes = max(nbytes, (width + 7) // 8)
+    raw = np.frombuffer(b''.join(blob.ljust(nbytes, b'\0') for blob in blobs), dtype=np.uint8)
+    matrix = np.unpackbits(raw.reshape(len(blobs), nbytes), axis=1, bitorder='little').astype(bool)
+    return matrix[:, :width] if width is not None else matrix
+
+
+def with_mark(present_bits, absent_bits, ordinal, is_present):
+    """Return (present_bits, absent_bits) with the mark at `ordinal` set to is_present."""
+    width = max(8 * max(len(present_bits or b''), len(absent_bits or b'')), ordinal + 1)
+    present, absent = unpack([present_bits, absent_bits], width)
+    present[ordinal] = is_present
+    absent[ordinal] = not is_present
+    return pack(present), pack(absent)
+
+
+def absent_runs(present, absent):
+    """
+    Current and longest run of absences per row of two boolean matrices.
+    Unmarked sessions neither extend nor break a run.
+    """
+    rows, width = absent.shape
+    if width == 0:
+        zeros = np.zeros(rows, dtype=np.int64)
+        return zeros, zeros
+    # Narrow integers: these matrices are students x sessions and int64 would dominate the time.
+    dtype = np.int16 if width < np.iinfo(np.int16).max else np.int32
+    absences = np.cumsum(absent, axis=1, dtype=dtype)
+    # absences never decreases, so its value at the last present mark is a running max.
+    runs = absences - np.maximum.accumulate(np.where(present, absences, 0), axis=1)
+    return runs[:, -1].astype(np.int64), runs.max(axis=1).astype(np.int64)
+
+
+def timeline_totals(present_blobs, absent_blobs):
+    """(present, absent, current_streak, max_absent_streak) arrays, one entry per timeline."""
+    width = 8 * max([len(blob or b'') for blob in (*present_blobs, *absent_blobs)] + [0])
+    present = unpack(present_blobs, width)
+    absent = unpack(absent_blobs, width)
+    current, longest = absent_runs(present, absent)
+    return present.sum(axis=1), absent.sum(axis=1), current, longest
+
+
+def recent_absences(absent, held, window):
+    """Absences among each row's last `window` sessions; held is the sessions held per row."""
+    held = np.asarray(held, dtype=np.int64)
+    columns = np.arange(absent.shape[1])
+    in_window = (columns >= (held - window)[:, None]) & (columns < held[:, None])
+    return (absent & in_window).sum(axis=1)
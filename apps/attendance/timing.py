@@ -0,0 +1,203 @@
+"""
+Per-stage timing for the face recognition and registration pipelines.
+
+Each request collects stage durations in a StageTimer. Finished timers are
+added to per-minute log-scale histograms kept by each worker process, which
+every few seconds copies them to the shared cache so any worker can report
+rolling p50/p95/p99 per stage for itself, every worker, and the whole node.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.attendance.encoder import run_encoder
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds from 0.05 ms to 60 s, ~25% apart; the last bucket is overflow.
+BUCKET_BOUNDS_MS = np.geomspace(0.05, 60000, 64)
+WINDOW_MINUTES = 15
+FLUSH_INTERVAL = 10
+WORKERS_KEY = 'recognition_timing_workers'
+HEADER = 'X-Recognition-Timing'
+
+# pipeline -> minute -> stage -> bucket counts
+_histograms = {}
+_last_flush = 0.0
+_lock = threading.Lock()
+
+
+def _worker_id():
+    # Computed per call: gunicorn forks workers after this module may be imported.
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_key(worker_id):
+    return f"recognition_timing_{worker_id}"
+
+
+class StageTimer:
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.stages = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def add_worker(self, timings, wall_ms):
+        """Add stages timed inside an encoder process; the rest of wall_ms is pool queueing/transfer."""
+        for name, ms in timings.items():
+            self.add(name, ms)
+        self.add('queue', max(0.0, wall_ms - sum(timings.values())))
+
+    def finish(self):
+        self.stages['total'] = (time.perf_counter() - self._started) * 1000
+        record(self.pipeline, self.stages)
+        return self.stages
+
+    def header(self):
+        return ', '.join(f"{name}={ms:.1f}" for name, ms in self.stages.items())
+
+
+def record(pipeline, stages):
+    minute = int(time.time() // 60)
+    with _lock:
+        by_minute = _histograms.setdefault(pipeline, {})
+        counts = by_minute.setdefault(minute, {})
+        for name, ms in stages.items():
+            if name not in counts:
+                counts[name] = np.zeros(len(BUCKET_BOUNDS_MS) + 1, dtype=np.uint32)
+            counts[name][np.searchsorted(BUCKET_BOUNDS_MS, ms)] += 1
+        for old in [m for m in by_minute if m <= minute - WINDOW_MINUTES]:
+            del by_minute[old]
+    if time.time() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """Copy this worker's histograms to the shared cache and register the worker."""
+    global _last_flush
+    now = time.time()
+    with _lock:
+        _last_flush = now
+        snapshot = {
+            pipeline: {minute: {name: c.copy() for name, c in stages.items()} for minute, stages in by_minute.items()}
+            for pipeline, by_minute in _histograms.items()
+        }
+    worker_id = _worker_id()
+    try:
+        cache.set(_worker_key(worker_id), snapshot, timeout=WINDOW_MINUTES * 60)
+        workers = cache.get(WORKERS_KEY) or {}
+        workers = {w: seen for w, seen in workers.items() if now - seen < WINDOW_MINUTES * 60}
+        workers[worker_id] = now
+        cache.set(WORKERS_KEY, workers, timeout=None)
+    except Exception as e:
+        # Metrics must never break recognition.
+        logger.warning(f"Could not publish recognition timings: {e}")
+
+
+def _percentile(counts, q):
+    total = counts.sum()
+    if not total:
+        return None
+    bucket = int(np.searchsorted(np.cumsum(counts), q * total))
+    return round(float(BUCKET_BOUNDS_MS[min(bucket, len(BUCKET_BOUNDS_MS) - 1)]), 2)
+
+
+def _summarise(merged):
+    return {
+        pipeline: {
+            name: {
+                'count': int(counts.sum()),
+                'p50_ms': _percentile(counts, 0.50),
+                'p95_ms': _percentile(counts, 0.95),
+                'p99_ms': _percentile(counts, 0.99),
+            }
+            for name, counts in stages.items()
+        }
+        for pipeline, stages in merged.items()
+    }
+
+
+def _merge_into(merged, snapshot, since_minute):
+    for pipeline, by_minute in snapshot.items():
+        for minute, stages in by_minute.items():
+            if minute < since_minute:
+                continue
+            target = merged.setdefault(pipeline, {})
+            for name, counts in stages.items():
+                if name in target:
+                    target[name] = target[name] + counts
+                else:
+                    target[name] = counts.astype(np.uint64)
+
+
+def timing_summary(minutes=WINDOW_MINUTES):
+    """p50/p95/p99 per pipeline stage over the last `minutes`, per worker and node-wide."""
+    minutes = max(1, min(minutes, WINDOW_MINUTES))
+    flush()
+    since_minute = int(time.time() // 60) - minutes + 1
+
+    node, per_worker = {}, {}
+    for worker_id in sorted(cache.get(WORKERS_KEY) or {}):
+        snapshot = cache.get(_worker_key(worker_id))
+        if not snapshot:
+            continue
+        merged = {}
+        _merge_into(merged, snapshot, since_minute)
+        _merge_into(node, snapshot, since_minute)
+        if merged:
+            per_worker[worker_id] = _summarise(merged)
+
+    return {
+        'window_minutes': minutes,
+        'node': _summarise(node),
+        'workers': per_worker,
+    }
+
+
+def timed_view(pipeline):
+    """
+    Give the view a StageTimer as request.stage_timer. Timers that recorded
+    any stage are added to the histograms, and the stage breakdown is sent in
+    an X-Recognition-Timing header when RECOGNITION_TIMING_HEADER is on.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timer = StageTimer(pipeline)
+            request.stage_timer = timer
+            response = view(request, *args, **kwargs)
+            if timer.stages:
+                timer.finish()
+                if settings.RECOGNITION_TIMING_HEADER:
+                    response[HEADER] = timer.header()
+            return response
+        return wrapper
+    return decorator
+
+
+def run_encoder_timed(timer, fn, *args):
+    """run_encoder for the *_timed encoder functions; adds their stage timings to timer."""
+    started = time.perf_counter()
+    result, timings = run_encoder(fn, *args)
+    timer.add_worker(timings, (time.perf_counter() - started) * 1000)
+    return result
@@ -1,7 +1,19 @@
 from django.urls import path
-from .views import start_session, recognize_face
+from .views import (
+    start_session, session_status, session_roster, session_feed_view, close_session_view,
+    recognize_face, recognize_batch, identify_campus, export_register, dedup_stats, timing_stats,
+)
 
 urlpatterns = [
     path('session/start/<int:subject_id>/', start_session, name='start_session'),
+    path('session/<int:session_id>/status/', session_status, name='session_status'),
+    path('session/<int:session_id>/roster/', session_roster, name='session_roster'),
+    path('session/<int:session_id>/feed/', session_feed_view, name='session_feed'),
+    path('session/<int:session_id>/close/', close_session_view, name='close_session'),
     path('recognize/<int:session_id>/', recognize_face, name='recognize_face'),
+    path('recognize/<int:session_id>/batch/', recognize_batch, name='recognize_batch'),
+    path('identify/', identify_campus, name='identify_campus'),
+    path('export/', export_register, name='export_attendance_register'),
+    path('metrics/dedup/', dedup_stats, name='attendance_dedup_stats'),
+    path('metrics/timing/', timing_stats, name='attendance_timing_stats'),
 ]
\ No newline at end of file
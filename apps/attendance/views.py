@@ -1,22 +1,43 @@
 import json
 import logging
-import face_recognition
-import numpy as np
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.core.cache import cache
-from apps.accounts.decorators import faculty_required
+from django.utils.dateparse import parse_datetime
+from apps.accounts.decorators import admin_required, faculty_required
 from apps.subjects.models import Subject
 from apps.students.models import Student
 from apps.core.models import TimetableSlot
-from apps.attendance.models import FaceData, AttendanceSession, AttendanceRecord
+from apps.attendance.models import AttendanceSession, AttendanceRecord
+from apps.attendance.matcher import DEFAULT_TOLERANCE
+from apps.attendance.gallery import get_semester_gallery, peek_semester_gallery, warm_semester_gallery
+from apps.attendance.encoder import (
+    encode_image_timed, encode_images_timed, pipeline_options, EncoderBusy, EncoderTimeout,
+)
+from apps.attendance.services import mark_present, get_present_ids, close_session, apply_roster
+from apps.attendance.dedup import split_duplicates, remember_result, get_dedup_stats
+from apps.attendance.campus_index import identify_faces
+from apps.attendance.feed import clean_source, touch_source, active_sources, session_feed
+from apps.attendance.export import register_sessions, register_rows, csv_stream, spreadsheet_stream
+from apps.attendance.timing import timed_view, run_encoder_timed, timing_summary, WINDOW_MINUTES
 
 logger = logging.getLogger(__name__)
 
 WEEKDAY_MAP = {0: 'MON', 1: 'TUE', 2: 'WED', 3: 'THU', 4: 'FRI', 5: 'SAT'}
+BUSY_RETRY_AFTER = 2
+MAX_BATCH_FRAMES = 8
+
+
+def _busy_response():
+    response = JsonResponse(
+        {'status': 'busy', 'message': 'Recognition is busy, retry shortly', 'retry_after': BUSY_RETRY_AFTER},
+        status=503,
+    )
+    response['Retry-After'] = str(BUSY_RETRY_AFTER)
+    return response
+
 
 @login_required
 @faculty_required
@@ -46,103 +67,390 @@ def start_session(request, subject_id):
         status=True
     )
 
-    semester = subject.semester
-    cache_key = f"face_enc_{session.id}"
+    # Prepare the semester gallery in the background; the page polls session_status.
+    gallery_ready = warm_semester_gallery(subject.semester)
 
-    semester_students = Student.objects.filter(semester=semester).values_list('id', flat=True)
-    known_faces_qs = FaceData.objects.filter(
-        student_id__in=semester_students
-    ).exclude(encoding_json__isnull=True).select_related('student__user')
+    return render(request, 'attendance/take_attendance.html', {'session': session, 'gallery_ready': gallery_ready})
 
-    cached_data = []
-    for fd in known_faces_qs:
-        try:
-            encoding = fd.get_encoding()
-            cached_data.append({
-                'encoding': encoding.tolist(),
-                'student_id': fd.student_id,
-                'name': fd.student.user.first_name,
+
+@login_required
+@faculty_required
+def session_status(request, session_id):
+    try:
+        session = get_object_or_404(AttendanceSession.objects.select_related('subject'), id=session_id)
+        if not session.status:
+            return _closed_response()
+        semester = session.subject.semester
+        gallery = peek_semester_gallery(semester)
+        if gallery is None:
+            # Also restarts the warm-up if this worker isn't the one that started it.
+            warm_semester_gallery(semester)
+            return JsonResponse({'status': 'warming', 'message': 'Preparing face gallery'})
+        return JsonResponse({
+            'status': 'ready',
+            'registered': len(gallery),
+            'present': len(get_present_ids(session)),
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+
+def _owns_session(request, session):
+    # faculty_required also admits admins, who have no faculty profile and may act on any session.
+    if request.user.is_admin:
+        return True
+    faculty = getattr(request.user, 'faculty_profile', None)
+    return faculty is not None and session.subject.faculty_id == faculty.id
+
+
+@login_required
+@faculty_required
+def close_session_view(request, session_id):
+    if request.method != 'POST':
+        return redirect('faculty_attendance')
+    session = get_object_or_404(AttendanceSession.objects.select_related('subject'), id=session_id)
+    if not _owns_session(request, session):
+        messages.error(request, "You can only close sessions of your own subjects.")
+        return redirect('faculty_attendance')
+
+    try:
+        present, absent = close_session(session)
+        messages.success(
+            request,
+            f'Attendance for "{session.subject.name}" saved: {present} present, {absent} marked absent.'
+        )
+    except Exception as e:
+        logger.error(f"Could not close session {session.id}: {e}")
+        messages.error(request, f"Could not close the session: {e}")
+    return redirect('faculty_attendance')
+
+
+@login_required
+@faculty_required
+def session_roster(request, session_id):
+    """
+    GET: the semester's students with their current mark in this session.
+    POST: JSON {"statuses": {"<student_id>": true|false, ...}}; any subset of
+    the roster, only changed rows are written.
+    """
+    try:
+        session = get_object_or_404(AttendanceSession.objects.select_related('subject'), id=session_id)
+        if not _owns_session(request, session):
+            return JsonResponse({'status': 'error', 'message': 'Not your session'}, status=403)
+        students = Student.objects.filter(semester=session.subject.semester)
+
+        if request.method == 'POST':
+            try:
+                statuses = json.loads(request.body)['statuses']
+                statuses = {int(sid): bool(present) for sid, present in statuses.items()}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return JsonResponse({'status': 'error', 'message': 'Expected {"statuses": {student_id: bool}}'}, status=400)
+            enrolled = set(students.filter(id__in=statuses.keys()).values_list('id', flat=True))
+            unknown = sorted(set(statuses) - enrolled)
+            if unknown:
+                return JsonResponse({'status': 'error', 'message': 'Students not on this roster', 'unknown': unknown}, status=400)
+            created, updated = apply_roster(session, statuses)
+            return JsonResponse({
+                'status': 'success',
+                'created': len(created),
+                'updated': len(updated),
+                'unchanged': len(statuses) - len(created) - len(updated),
             })
-        except (json.JSONDecodeError, ValueError, TypeError) as e:
-            logger.warning(f"Bad face encoding for student {fd.student}: {e}")
-            continue
 
-    cache.set(cache_key, cached_data, timeout=7200)
+        marks = dict(
+            AttendanceRecord.objects.filter(session=session).values_list('student_id', 'is_present')
+        )
+        roster = [
+            {
+                'id': sid,
+                'name': f"{first} {last}".strip(),
+                'enrollment_number': enrollment,
+                'is_present': marks.get(sid),
+            }
+            for sid, first, last, enrollment in students.order_by('enrollment_number').values_list(
+                'id', 'user__first_name', 'user__last_name', 'enrollment_number',
+            )
+        ]
+        return JsonResponse({'status': 'success', 'open': session.status, 'students': roster})
+
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+
+@login_required
+@faculty_required
+def session_feed_view(request, session_id):
+    """
+    Merged marks from every device on the session, for the capture pages to
+    poll. ?since=<cursor from the previous reply> returns only newer changes.
+    """
+    try:
+        session = get_object_or_404(AttendanceSession.objects.select_related('subject'), id=session_id)
+        if not _owns_session(request, session):
+            return JsonResponse({'status': 'error', 'message': 'Not your session'}, status=403)
+        since = request.GET.get('since')
+        if since:
+            since = parse_datetime(since.replace(' ', '+'))  # an unencoded UTC offset arrives as a space
+            if since is None:
+                return JsonResponse({'status': 'error', 'message': 'Invalid since'}, status=400)
+        events, cursor = session_feed(session, since or None)
+        return JsonResponse({
+            'status': 'success' if session.status else 'closed',
+            'events': events,
+            'cursor': cursor,
+            'sources': active_sources(session.id),
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+
+def _all_present(session, gallery):
+    return len(gallery) > 0 and get_present_ids(session).issuperset(gallery.student_ids)
+
+
+def _load_session_gallery(request, session_id):
+    timer = request.stage_timer
+    with timer.stage('session'):
+        session = get_object_or_404(AttendanceSession.objects.select_related('subject'), id=session_id)
+    if not session.status:
+        return session, None, False
+    with timer.stage('gallery'):
+        gallery = get_semester_gallery(session.subject.semester)
+    with timer.stage('present'):
+        complete = _all_present(session, gallery)
+    return session, gallery, complete
+
+
+def _complete_response():
+    return JsonResponse({'status': 'complete', 'identified': [], 'message': 'All registered students are marked'})
+
+
+def _closed_response():
+    return JsonResponse({'status': 'closed', 'identified': [], 'message': 'Session is closed'})
+
+
+def _identify(session, gallery, encodings, timer, source=''):
+    # Nearest-match still runs over the whole gallery: leaving present students
+    # out would let a lookalike unmarked student claim their face. The saving
+    # comes from skipping writes (and whole frames) for known-present students.
+    with timer.stage('match'):
+        matches = [m for m in gallery.match(encodings, tolerance=DEFAULT_TOLERANCE) if m is not None]
+    with timer.stage('write'):
+        newly_marked = mark_present(session, [m.student_id for m in matches], source=source)
+
+    identified_names = []
+    for match in matches:
+        if match.student_id in newly_marked:
+            identified_names.append(f"{match.name} (Marked Present)")
+        else:
+            identified_names.append(f"{match.name} (Already Marked)")
+    return matches, identified_names
+
+
+def _duplicate_response(previous, frame_count=None):
+    # Everyone in the previous result was marked when it was recognised.
+    payload = {'duplicate': True}
+    if frame_count is not None:
+        payload['frames'] = frame_count
+    if not previous['matches']:
+        return JsonResponse({'status': 'failed', 'message': 'No face detected', **payload})
+    identified_names = [f"{name} (Already Marked)" for _, name in previous['matches']]
+    return JsonResponse({'status': 'success', 'identified': identified_names, **payload})
 
-    return render(request, 'attendance/take_attendance.html', {'session': session})
 
 @login_required
 @faculty_required
+@timed_view('recognize')
 def recognize_face(request, session_id):
     if request.method == 'POST':
+        timer = request.stage_timer
         try:
-            session = get_object_or_404(AttendanceSession, id=session_id)
+            session, gallery, complete = _load_session_gallery(request, session_id)
+            if gallery is None:
+                return _closed_response()
+            if complete:
+                return _complete_response()
+            source = clean_source(request.POST.get('source'))
+            touch_source(session.id, source)
             
-            image_file = request.FILES.get('image')
-            if not image_file:
-                return JsonResponse({'status': 'error', 'message': 'No image data'})
+            with timer.stage('upload'):
+                image_file = request.FILES.get('image')
+                if not image_file:
+                    return JsonResponse({'status': 'error', 'message': 'No image data'})
+                frames = [image_file.read()]
 
-            unknown_image = face_recognition.load_image_file(image_file)
-            unknown_encodings = face_recognition.face_encodings(unknown_image)
+            with timer.stage('dedup'):
+                fresh, previous = split_duplicates(session.id, frames, source)
+            if not fresh:
+                return _duplicate_response(previous)
+            frame_hash, data = fresh[0]
+
+            try:
+                unknown_encodings = run_encoder_timed(timer, encode_image_timed, data, pipeline_options())
+            except (EncoderBusy, EncoderTimeout):
+                return _busy_response()
 
             if not unknown_encodings:
+                remember_result(session.id, frame_hash, [], source)
                 return JsonResponse({'status': 'failed', 'message': 'No face detected'})
 
-            cache_key = f"face_enc_{session_id}"
-            cached_data = cache.get(cache_key)
-
-            if cached_data is None:
-                semester = session.subject.semester
-                semester_students = Student.objects.filter(semester=semester).values_list('id', flat=True)
-                known_faces_qs = FaceData.objects.filter(
-                    student_id__in=semester_students
-                ).exclude(encoding_json__isnull=True).select_related('student__user')
-
-                cached_data = []
-                for fd in known_faces_qs:
-                    try:
-                        encoding = fd.get_encoding()
-                        cached_data.append({
-                            'encoding': encoding.tolist(),
-                            'student_id': fd.student_id,
-                            'name': fd.student.user.first_name,
-                        })
-                    except (json.JSONDecodeError, ValueError, TypeError) as e:
-                        logger.warning(f"Bad face encoding for student {fd.student}: {e}")
-                        continue
-                cache.set(cache_key, cached_data, timeout=7200)
-
-            known_encodings = [np.array(d['encoding']) for d in cached_data]
-            known_student_ids = [d['student_id'] for d in cached_data]
-            known_names = [d['name'] for d in cached_data]
-
-            identified_names = []
-
-            for unknown_encoding in unknown_encodings:
-                matches = face_recognition.compare_faces(known_encodings, unknown_encoding, tolerance=0.5)
-                
-                if True in matches:
-                    first_match_index = matches.index(True)
-                    student_id = known_student_ids[first_match_index]
-                    name = known_names[first_match_index]
-                    
-                    record, created = AttendanceRecord.objects.get_or_create(
-                        session=session,
-                        student_id=student_id,
-                        defaults={
-                            'is_present': True,
-                            'method': 'FACE'
-                        }
-                    )
-                    
-                    if created:
-                        identified_names.append(f"{name} (Marked Present)")
-                    else:
-                        identified_names.append(f"{name} (Already Marked)")
-
+            matches, identified_names = _identify(session, gallery, unknown_encodings, timer, source)
+            remember_result(session.id, frame_hash, matches, source)
             return JsonResponse({'status': 'success', 'identified': identified_names})
 
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)})
 
     return JsonResponse({'status': 'error', 'message': 'Invalid request'})
+
+
+@login_required
+@faculty_required
+@timed_view('recognize_batch')
+def recognize_batch(request, session_id):
+    if request.method == 'POST':
+        timer = request.stage_timer
+        try:
+            session, gallery, complete = _load_session_gallery(request, session_id)
+            if gallery is None:
+                return _closed_response()
+            if complete:
+                return _complete_response()
+            source = clean_source(request.POST.get('source'))
+            touch_source(session.id, source)
+
+            with timer.stage('upload'):
+                image_files = request.FILES.getlist('images')[:MAX_BATCH_FRAMES]
+                if not image_files:
+                    return JsonResponse({'status': 'error', 'message': 'No image data'})
+                frames = [f.read() for f in image_files]
+
+            with timer.stage('dedup'):
+                fresh, previous = split_duplicates(session.id, frames, source)
+            if not fresh:
+                return _duplicate_response(previous, frame_count=len(image_files))
+            last_hash = fresh[-1][0]
+
+            try:
+                per_frame = run_encoder_timed(
+                    timer, encode_images_timed, [data for _, data in fresh], pipeline_options(),
+                )
+            except (EncoderBusy, EncoderTimeout):
+                return _busy_response()
+
+            # Matching all frames together lets the gallery keep one (closest)
+            # face per student, which dedupes identities across frames.
+            unknown_encodings = [enc for frame in per_frame for enc in frame]
+            if not unknown_encodings:
+                remember_result(session.id, last_hash, [], source)
+                return JsonResponse({'status': 'failed', 'message': 'No face detected', 'frames': len(image_files)})
+
+            matches, identified_names = _identify(session, gallery, unknown_encodings, timer, source)
+            remember_result(session.id, last_hash, matches, source)
+            return JsonResponse({'status': 'success', 'identified': identified_names, 'frames': len(image_files)})
+
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
+
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'})
+
+
+@login_required
+@faculty_required
+@timed_view('identify')
+def identify_campus(request):
+    """Identify faces against every registered student (gates, library)."""
+    if request.method == 'POST':
+        timer = request.stage_timer
+        try:
+            with timer.stage('upload'):
+                image_file = request.FILES.get('image')
+                if not image_file:
+                    return JsonResponse({'status': 'error', 'message': 'No image data'})
+                data = image_file.read()
+
+            try:
+                encodings = run_encoder_timed(timer, encode_image_timed, data, pipeline_options())
+            except (EncoderBusy, EncoderTimeout):
+                return _busy_response()
+
+            if not encodings:
+                return JsonResponse({'status': 'failed', 'message': 'No face detected'})
+
+            with timer.stage('match'):
+                neighbours = identify_faces(encodings)
+            with timer.stage('lookup'):
+                student_ids = {n[0][0] for n in neighbours if n}
+                students = Student.objects.filter(id__in=student_ids).select_related('user').in_bulk()
+
+            identified = []
+            for nearest in neighbours:
+                if not nearest or nearest[0][0] not in students:
+                    continue
+                student_id, distance = nearest[0]
+                student = students[student_id]
+                identified.append({
+                    'student_id': student_id,
+                    'name': student.user.get_full_name(),
+                    'enrollment_number': student.enrollment_number,
+                    'distance': round(distance, 3),
+                })
+            return JsonResponse({'status': 'success', 'identified': identified})
+
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
+
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'})
+
+@login_required
+@admin_required
+def export_register(request):
+    """Attendance register for ?subject=<id> or ?semester=<n>, as &format=csv (default) or xls."""
+    export_format = request.GET.get('format', 'csv')
+    subject_id = request.GET.get('subject')
+    semester = request.GET.get('semester')
+    if export_format not in ('csv', 'xls') or not (subject_id or semester) or (subject_id and not subject_id.isdigit()):
+        messages.error(request, 'Choose a subject or semester and a format (csv or xls) to export.')
+        return redirect('subject_list')
+
+    if subject_id:
+        subject = get_object_or_404(Subject, id=subject_id)
+        semester = subject.semester
+        sessions = register_sessions(subject=subject)
+        title = f"{subject.code}_register"
+    else:
+        try:
+            semester = int(semester)
+        except ValueError:
+            messages.error(request, 'Invalid semester.')
+            return redirect('subject_list')
+        sessions = register_sessions(semester=semester)
+        title = f"semester_{semester}_register"
+
+    logger.info(f"Register export {title} ({len(sessions)} sessions, {export_format}) by {request.user}")
+    rows = register_rows(sessions, semester, with_subject=not subject_id)
+    if export_format == 'csv':
+        content, content_type = csv_stream(rows), 'text/csv'
+    else:
+        content, content_type = spreadsheet_stream(rows, title), 'application/vnd.ms-excel'
+    return StreamingHttpResponse(
+        content,
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename="{title}.{export_format}"'},
+    )
+
+
+@login_required
+@admin_required
+def dedup_stats(request):
+    return JsonResponse(get_dedup_stats())
+
+
+@login_required
+@admin_required
+def timing_stats(request):
+    try:
+        minutes = int(request.GET.get('minutes', WINDOW_MINUTES))
+    except ValueError:
+        minutes = WINDOW_MINUTES
+    return JsonResponse(timing_summary(minutes))
@@ -1,3 +1,69 @@
+from datetime import time
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.accounts.models import User
+from apps.faculty.models import Faculty
+from apps.subjects.models import Subject
+from apps.core.models import Batch, Classroom, TimetableSlot
+from apps.core.timetable_import import import_timetable_slots
+
+
+def slot(initials='ABC', day='MON', start='09:00', end='10:00', code='PY', **extra):
+    return {
+        'day': day, 'start_time': start, 'end_time': end, 'class_name': 'CE5A', 'semester': 5,
+        'subject_code': code, 'initials': initials, 'room': '101', 'is_lab': False, 'batch_code': '',
+        **extra,
+    }
+
+
+class TimetableImportTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='fac1', email='fac1@test.invalid', password='x', role=User.Role.FACULTY)
+        self.faculty = Faculty.objects.create(user=user, employee_id='fac1', initials='ABC')
+        self.subject = Subject.objects.create(name='Python', code='CE-PY5', semester=5)
+
+    def test_creates_slots_and_related_rows(self):
+        created, updated, skipped = import_timetable_slots([
+            slot(),
+            slot(start='10:00', end='11:00', code='DBMS'),
+            slot(start='11:00', end='13:00', is_lab=True, batch_code='CE5A1', code='DBMS'),
+        ])
+        self.assertEqual((created, updated, skipped), (3, 0, []))
+        self.assertEqual(TimetableSlot.objects.get(start_time=time(9)).subject, self.subject)
+        self.assertEqual(Subject.objects.filter(code='DBMS', semester=5).count(), 1)
+        self.assertEqual(set(Batch.objects.values_list('name', flat=True)), {'CE5A-ALL', 'CE5A1'})
+        self.assertEqual(Classroom.objects.get().semester, 5)
+
+    def test_reimport_updates_existing_slot(self):
+        import_timetable_slots([slot()])
+        created, updated, _ = import_timetable_slots([slot(end='10:30', room='202')])
+        self.assertEqual((created, updated), (0, 1))
+        row = TimetableSlot.objects.get()
+        self.assertEqual((row.end_time, row.room_number), (time(10, 30), '202'))
+
+    def test_bad_slots_are_skipped(self):
+        created, _, skipped = import_timetable_slots([
+            slot(initials='xyz'),
+            slot(start='9am'),
+            slot(room='R' * 20),
+            slot(initials='abc', day='TUE'),
+        ])
+        self.assertEqual(created, 1)
+        self.assertEqual(len(skipped), 3)
+        self.assertEqual(TimetableSlot.objects.get().day, 'TUE')
+
+    def test_unknown_faculty_still_creates_related_rows(self):
+        created, _, skipped = import_timetable_slots([slot(initials='XYZ', code='CN', class_name='CE5B')])
+        self.assertEqual((created, len(skipped)), (0, 1))
+        self.assertFalse(TimetableSlot.objects.exists())
+        self.assertTrue(Classroom.objects.filter(name='CE5B').exists())
+        self.assertTrue(Batch.objects.filter(name='CE5B-ALL').exists())
+        self.assertTrue(Subject.objects.filter(code='CN', semester=5).exists())
+
+    def test_clear_existing(self):
+        import_timetable_slots([slot(), slot(day='TUE')])
+        created, _, _ = import_timetable_slots([slot(day='WED')], clear_existing=True)
+        self.assertEqual(created, 1)
+        self.assertEqual(list(TimetableSlot.objects.values_list('day', flat=True)), ['WED'])
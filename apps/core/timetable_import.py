@@ -0,0 +1,178 @@
+"""
+Writes parsed timetable slots (see timetable_parser.py) to the database.
+
+Set-based: classrooms, batches, subjects, faculty and the existing slots are
+loaded into dicts up front, every slot is resolved in memory, and the
+changes are applied with bulk_create/bulk_update in one transaction. The
+number of queries does not grow with the number of slots in the PDF.
+
+Resolution matches the previous per-slot import: a classroom or batch is
+found by name and created if missing, a subject is the first of the slot's
+semester whose code contains the parsed code (else one with that exact code,
+else a new one), faculty are matched by initials ignoring case, and a slot
+is keyed by (day, start time, faculty). As before, a slot whose faculty is
+unknown is skipped but its classroom, batch and subject are still created.
+"""
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+
+from apps.faculty.models import Faculty
+from apps.subjects.models import Subject
+from apps.core.models import Classroom, Batch, TimetableSlot
+
+logger = logging.getLogger(__name__)
+
+SLOT_FIELDS = ['end_time', 'batch', 'subject', 'room_number']
+
+
+def _max_length(model, field):
+    return model._meta.get_field(field).max_length
+
+
+def _batch_name(slot):
+    if slot.get('is_lab') and slot.get('batch_code'):
+        return slot['batch_code']
+    return f"{slot['class_name']}-ALL"
+
+
+def _validate(slot):
+    """Problems that would make a row fail to save; the import runs in one transaction, so they are caught first."""
+    limits = [
+        ('class_name', slot['class_name'], Classroom, 'name'),
+        ('batch', _batch_name(slot), Batch, 'name'),
+        ('subject_code', slot['subject_code'], Subject, 'code'),
+        ('room', slot['room'], TimetableSlot, 'room_number'),
+    ]
+    for label, value, model, field in limits:
+        if len(value) > _max_length(model, field):
+            raise ValueError(f"{label} '{value}' is too long")
+    return (
+        datetime.strptime(slot['start_time'], '%H:%M').time(),
+        datetime.strptime(slot['end_time'], '%H:%M').time(),
+    )
+
+
+def _create_missing(model, names, build, key='name'):
+    """Bulk create `model` rows for names not yet in the DB; returns {name: instance} for all names."""
+    found = {getattr(obj, key): obj for obj in model.objects.filter(**{f"{key}__in": names})}
+    missing = [name for name in names if name not in found]
+    if missing:
+        model.objects.bulk_create([build(name) for name in missing])
+        # Re-read: MySQL does not return primary keys from bulk_create.
+        found.update({getattr(obj, key): obj for obj in model.objects.filter(**{f"{key}__in": missing})})
+    return found
+
+
+def import_timetable_slots(slots_data, clear_existing=False):
+    """Returns (created_count, updated_count, skipped messages)."""
+    skipped = []
+    resolved = []
+    faculty_by_initials = {}
+    for faculty_id, initials in Faculty.objects.exclude(initials='').order_by('id').values_list('id', 'initials'):
+        faculty_by_initials.setdefault(initials.lower(), faculty_id)
+
+    for slot in slots_data:
+        try:
+            times = _validate(slot)
+        except (KeyError, TypeError, ValueError) as e:
+            skipped.append(f"{slot.get('day')} {slot.get('start_time')}: {e}")
+            continue
+        faculty_id = faculty_by_initials.get(slot['initials'].lower())
+        if not faculty_id:
+            skipped.append(
+                f"{slot['day']} {slot['start_time']}: Faculty '{slot['initials']}' not found — skipped"
+            )
+        resolved.append((slot, times, faculty_id))
+
+    with transaction.atomic():
+        if clear_existing:
+            deleted_count = TimetableSlot.objects.all().delete()[0]
+            logger.info(f"Cleared {deleted_count} existing timetable slots")
+        if not resolved:
+            return 0, 0, skipped
+
+        # Classrooms and batches keep the details of the first slot that names them, as get_or_create did.
+        classroom_semester, batch_classroom = {}, {}
+        for slot, _, _ in resolved:
+            classroom_semester.setdefault(slot['class_name'], slot['semester'])
+            batch_classroom.setdefault(_batch_name(slot), slot['class_name'])
+        classrooms = _create_missing(
+            Classroom, list(classroom_semester),
+            lambda name: Classroom(name=name, semester=classroom_semester[name]),
+        )
+        batches = _create_missing(
+            Batch, list(batch_classroom),
+            lambda name: Batch(name=name, classroom=classrooms[batch_classroom[name]]),
+        )
+
+        subject_for = _resolve_subjects(list(dict.fromkeys((slot['subject_code'], slot['semester']) for slot, _, _ in resolved)))
+
+        existing = {
+            (slot.day, slot.start_time, slot.faculty_id): slot
+            for slot in TimetableSlot.objects.filter(
+                faculty_id__in={faculty_id for _, _, faculty_id in resolved if faculty_id},
+                day__in={slot['day'] for slot, _, _ in resolved},
+            )
+        }
+        to_create, to_update = {}, {}
+        created_count = updated_count = 0
+        for slot, (start_time, end_time), faculty_id in resolved:
+            if not faculty_id:
+                continue
+            key = (slot['day'], start_time, faculty_id)
+            values = {
+                'end_time': end_time,
+                'batch': batches[_batch_name(slot)],
+                'subject': subject_for[(slot['subject_code'], slot['semester'])],
+                'room_number': slot['room'],
+            }
+            # A later slot with the same key overwrites the earlier one and counts as an update.
+            target = to_create.get(key) or existing.get(key)
+            if target is None:
+                to_create[key] = TimetableSlot(day=key[0], start_time=start_time, faculty_id=faculty_id, **values)
+                created_count += 1
+                continue
+            for field, value in values.items():
+                setattr(target, field, value)
+            if key in existing:
+                to_update[key] = target
+            updated_count += 1
+
+        TimetableSlot.objects.bulk_create(to_create.values())
+        TimetableSlot.objects.bulk_update(to_update.values(), SLOT_FIELDS)
+
+    return created_count, updated_count, skipped
+
+
+def _resolve_subjects(pairs):
+    """
+    {(parsed code, semester): Subject} for pairs in PDF order; a code that
+    matches nothing is created once, in the semester of its first slot.
+    """
+    codes = {code for code, _ in pairs}
+    semesters = {semester for _, semester in pairs}
+    by_semester, by_code = {}, {}
+    for subject in Subject.objects.filter(Q(semester__in=semesters) | Q(code__in=codes)):  # Meta ordering: semester, code
+        by_semester.setdefault(subject.semester, []).append(subject)
+        by_code[subject.code] = subject
+
+    resolved, new = {}, {}
+    for code, semester in pairs:
+        match = next((s for s in by_semester.get(semester, []) if code.lower() in s.code.lower()), None)
+        match = match or by_code.get(code)
+        if match:
+            resolved[(code, semester)] = match
+        else:
+            new.setdefault(code, semester)
+
+    if new:
+        created = _create_missing(
+            Subject, list(new), lambda code: Subject(code=code, name=code, semester=new[code]), key='code',
+        )
+        for code, semester in pairs:
+            if (code, semester) not in resolved:
+                resolved[(code, semester)] = created[code]
+    return resolved
@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (admin_dashboard, upload_subjects, upload_students, download_sample_csv, 
-                    subject_list, download_sample_subjects_csv, 
+                    subject_list, download_sample_subjects_csv, upload_attendance, download_sample_attendance_csv,
                     student_list, faculty_list, upload_batches, 
                     upload_timetable, auto_generate_batches, load_subjects, load_classrooms, load_batches, index,
                     faculty_public, curriculum, gallery)
@@ -21,6 +21,8 @@ urlpatterns = [
     path('upload/subject/', upload_subjects, name='upload_subjects'),
     path('upload/sample-csv/', download_sample_csv, name='download_sample_csv'),
     path('upload/sample-subjects-csv/', download_sample_subjects_csv, name='download_sample_subjects_csv'),
+    path('upload/attendance/', upload_attendance, name='upload_attendance'),
+    path('upload/sample-attendance-csv/', download_sample_attendance_csv, name='download_sample_attendance_csv'),
     path('upload/batches/', upload_batches, name='upload_batches'),
     path('upload/timetable/', upload_timetable, name='upload_timetable'),
     path('batches/auto-generate/', auto_generate_batches, name='auto_generate_batches'),
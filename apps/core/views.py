@@ -11,12 +11,14 @@ from django.db import transaction
 from .forms import ManualBatchForm
 from .utils import send_welcome_email
 from .timetable_parser import parse_timetable_pdf
+from .timetable_import import import_timetable_slots
 from apps.accounts.models import User
 from apps.students.models import Student
 from apps.faculty.models import Faculty
 from apps.subjects.models import Subject
 from apps.notifications.models import Notification
-from apps.core.models import Classroom, Batch, TimetableSlot
+from apps.core.models import Classroom, Batch
+from apps.attendance.importer import import_attendance_csv
 
 logger = logging.getLogger(__name__)
 
@@ -211,6 +213,47 @@ def upload_subjects(request):
     return render(request, 'core/Upload_subjects.html')
 
 
+MAX_IMPORT_ERRORS_SHOWN = 20
+
+
+@login_required
+@user_passes_test(is_admin)
+def upload_attendance(request):
+    if request.method == "POST":
+        if 'file' not in request.FILES:
+            messages.error(request, "Please select a CSV file.")
+            return redirect('upload_attendance')
+
+        csv_file = request.FILES['file']
+        if not csv_file.name.endswith('.csv'):
+            messages.error(request, "Only CSV files are allowed.")
+            return redirect('upload_attendance')
+
+        try:
+            # Read line by line from the upload (spooled to disk when large), not decoded whole.
+            lines = io.TextIOWrapper(csv_file.file, encoding='utf-8-sig', newline='')
+            result = import_attendance_csv(lines)
+        except Exception as e:
+            logger.error(f"File processing error in upload_attendance: {e}")
+            messages.error(request, f"File processing error: {e}")
+            return redirect('upload_attendance')
+
+        if result.failed:
+            messages.error(request, f"{result.failed}. Rows before it were saved; fix the file and import it again.")
+        messages.success(
+            request,
+            f"{result.imported} of {result.rows} rows imported: {result.created} marks added, "
+            f"{result.updated} changed, {result.unchanged} already recorded, {result.sessions_created} sessions created."
+        )
+        for line_no, error in result.errors[:MAX_IMPORT_ERRORS_SHOWN]:
+            messages.warning(request, f"Row {line_no}: {error}")
+        if len(result.errors) > MAX_IMPORT_ERRORS_SHOWN:
+            messages.warning(request, f"...and {len(result.errors) - MAX_IMPORT_ERRORS_SHOWN} more rows with errors.")
+        return redirect('upload_attendance')
+
+    return render(request, 'core/Upload_attendance.html')
+
+
 @login_required
 @user_passes_test(is_admin)
 def student_list(request):
@@ -249,6 +292,16 @@ def download_sample_subjects_csv(request):
     writer.writerow(['Python Programming', '3361601', '6', '5'])
     return response
 
+@login_required
+@user_passes_test(is_admin)
+def download_sample_attendance_csv(request):
+    response = HttpResponse(content_type='text/csv', headers={'Content-Disposition': 'attachment; filename="sample_attendance.csv"'})
+    writer = csv.writer(response)
+    writer.writerow(['enrollment_number', 'subject_code', 'date', 'status'])
+    writer.writerow(['226170316001', '3361601', '2025-01-15', 'P'])
+    writer.writerow(['226170316002', '3361601', '2025-01-15', 'A'])
+    return response
+
 
 
 @login_required
@@ -277,74 +330,7 @@ def upload_timetable(request):
                     messages.warning(request, w)
                 return redirect('upload_timetable')
 
-            if clear_existing:
-                deleted_count = TimetableSlot.objects.all().delete()[0]
-                logger.info(f"Cleared {deleted_count} existing timetable slots")
-
-            created_count = 0
-            updated_count = 0
-            skipped = []
-
-            for slot in slots_data:
-                try:
-                    with transaction.atomic():
-                        classroom, _ = Classroom.objects.get_or_create(
-                            name=slot['class_name'],
-                            defaults={'semester': slot['semester']}
-                        )
-
-                        if slot.get('is_lab') and slot.get('batch_code'):
-                            batch_name = slot['batch_code']
-                        else:
-                            batch_name = f"{slot['class_name']}-ALL"
-                        batch, _ = Batch.objects.get_or_create(
-                            name=batch_name,
-                            defaults={'classroom': classroom}
-                        )
-
-                        subject = Subject.objects.filter(
-                            code__icontains=slot['subject_code'],
-                            semester=slot['semester']
-                        ).first()
-
-                        if not subject:
-                            subject, _ = Subject.objects.get_or_create(
-                                code=slot['subject_code'],
-                                defaults={
-                                    'name': slot['subject_code'],
-                                    'semester': slot['semester']
-                                }
-                            )
-
-                        faculty = Faculty.objects.filter(
-                            initials__iexact=slot['initials']
-                        ).first()
-
-                        if not faculty:
-                            skipped.append(
-                                f"{slot['day']} {slot['start_time']}: Faculty '{slot['initials']}' not found — skipped"
-                            )
-                            continue
-
-                        _, was_created = TimetableSlot.objects.update_or_create(
-                            day=slot['day'],
-                            start_time=slot['start_time'],
-                            faculty=faculty,
-                            defaults={
-                                'end_time': slot['end_time'],
-                                'batch': batch,
-                                'subject': subject,
-                                'room_number': slot['room'],
-                            }
-                        )
-
-                        if was_created:
-                            created_count += 1
-                        else:
-                            updated_count += 1
-
-                except Exception as e:
-                    skipped.append(f"{slot['day']} {slot['start_time']}: {e}")
+            created_count, updated_count, skipped = import_timetable_slots(slots_data, clear_existing)
 
             results = {
                 'created': created_count,
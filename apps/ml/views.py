@@ -1,12 +1,19 @@
+import numpy as np
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg, Q, F, FloatField, ExpressionWrapper
+from django.db.models import Count, Avg, Sum, Q, F, FloatField, ExpressionWrapper
 from apps.accounts.decorators import admin_required, faculty_required
 from apps.students.models import Student
-from apps.attendance.models import AttendanceRecord
+from apps.attendance.models import AttendanceSummary
+from apps.attendance.streaks import max_absent_streaks_sql
+from apps.attendance.summary import subject_timelines
+from apps.attendance.timeline import absent_runs, recent_absences
 from apps.exams.models import ExamResult
 from . import predictor
 
+RECENT_WINDOW = 5
+
 @login_required
 @admin_required
 def admin_ml_dashboard(request):
@@ -24,11 +31,11 @@ def admin_ml_dashboard(request):
     attendance_stats = {
         row['student_id']: row
         for row in (
-            AttendanceRecord.objects.filter(student_id__in=student_ids)
+            AttendanceSummary.objects.filter(student_id__in=student_ids)
             .values('student_id')
             .annotate(
-                total_records=Count('id'),
-                present_records=Count('id', filter=Q(is_present=True)),
+                total_records=Sum(F('present') + F('absent')),
+                present_records=Sum('present'),
             )
         )
     }
@@ -119,11 +126,11 @@ def faculty_anomaly_alerts(request):
     attendance_stats = {
         row['student_id']: row
         for row in (
-            AttendanceRecord.objects.filter(student_id__in=student_ids)
+            AttendanceSummary.objects.filter(student_id__in=student_ids)
             .values('student_id')
             .annotate(
-                total_records=Count('id'),
-                present_records=Count('id', filter=Q(is_present=True)),
+                total_records=Sum(F('present') + F('absent')),
+                present_records=Sum('present'),
             )
         )
     }
@@ -144,7 +151,10 @@ def faculty_anomaly_alerts(request):
             )
         )
     }
-    streak_map = _calculate_max_absent_streaks(student_ids)
+    use_sql = settings.ATTENDANCE_STREAK_BACKEND == 'sql'
+    streak_map, recent_map = _timeline_stats(student_ids, streaks=not use_sql)
+    if use_sql:
+        streak_map = max_absent_streaks_sql(student_ids)
 
     student_alerts = []
     for student in students:
@@ -178,6 +188,7 @@ def faculty_anomaly_alerts(request):
                 'attendance_pct': round(attendance_pct, 1),
                 'avg_marks': round(avg_marks, 1),
                 'absent_streak': absent_streak,
+                'recent_absences': recent_map.get(student.id, 0),
                 'anomaly': anomaly,
                 'risk': risk,
             })
@@ -187,27 +198,35 @@ def faculty_anomaly_alerts(request):
     return render(request, 'ml/faculty_anomaly_alerts.html', {
         'alerts': student_alerts,
         'total_alerts': len(student_alerts),
+        'recent_window': RECENT_WINDOW,
     })
 
 
-def _calculate_max_absent_streaks(student_ids):
-    """Calculate max consecutive absent streak for each student in one pass."""
-    streak_map = {sid: 0 for sid in student_ids}
-    current_map = {sid: 0 for sid in student_ids}
+def _per_student_max(student_ids, row_students, values):
+    totals = np.zeros(len(student_ids), dtype=np.int64)
+    if len(row_students):
+        position = {sid: i for i, sid in enumerate(student_ids)}
+        np.maximum.at(totals, [position[sid] for sid in row_students.tolist()], values)
+    return dict(zip(student_ids, totals.tolist()))
 
-    records = (
-        AttendanceRecord.objects
-        .filter(student_id__in=student_ids)
-        .order_by('student_id', 'session__date')
-        .values_list('student_id', 'is_present')
-    )
 
-    for student_id, is_present in records:
-        if not is_present:
-            current_map[student_id] += 1
-            if current_map[student_id] > streak_map[student_id]:
-                streak_map[student_id] = current_map[student_id]
-        else:
-            current_map[student_id] = 0
+def _timeline_stats(student_ids, window=RECENT_WINDOW, streaks=True):
+    """
+    Longest absence streak and absences in the last `window` classes, each
+    taken from the student's worst subject, computed on the packed
+    attendance timelines without reading any records. With streaks=False
+    only the recent absences are computed and the streak map is None.
+    """
+    row_students, held, present, absent = subject_timelines(student_ids)
+    recent = _per_student_max(student_ids, row_students, recent_absences(absent, held, window))
+    if not streaks:
+        return None, recent
+    _, longest = absent_runs(present, absent)
+    return _per_student_max(student_ids, row_students, longest), recent
 
-    return streak_map
+
+def _calculate_max_absent_streaks(student_ids):
+    """Calculate the longest absence streak (within one subject) for each student."""
+    if settings.ATTENDANCE_STREAK_BACKEND == 'sql':
+        return max_absent_streaks_sql(student_ids)
+    return _timeline_stats(student_ids)[0]
@@ -19,6 +19,7 @@ urlpatterns = [
     
     # Face Registration
     path('register-face/', views.register_face_view, name='register_face_view'),
+    path('register-face/status/', views.face_registration_status, name='face_registration_status'),
     
     # Profile
     path('profile/', views.student_profile, name='student_profile'),
@@ -1,17 +1,25 @@
+import logging
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count, Q
+from django.db.models import Sum
 from apps.accounts.decorators import student_required
 from apps.assignments.models import Assignment
 from apps.subjects.models import Subject
 from apps.notifications.models import Notification
 from apps.core.models import TimetableSlot 
 from apps.students.forms import FaceRegistrationForm
-from apps.attendance.models import FaceData, AttendanceRecord, AttendanceSession
-import face_recognition
+from apps.attendance.models import FaceData, AttendanceSummary
+from apps.attendance.encoder import encode_image_timed, pipeline_options, EncoderBusy, EncoderTimeout
+from apps.attendance.registration import queue_face_encoding, requeue_if_stale
+from apps.attendance.timing import timed_view, run_encoder_timed
+
+logger = logging.getLogger(__name__)
 
 
 @login_required
@@ -19,17 +27,15 @@ import face_recognition
 def attendance_stats(request):
     student = request.user.student_profile
 
-    subjects = Subject.objects.filter(semester=student.semester).annotate(
-        total_sessions=Count('attendancesession', distinct=True),
-        present_sessions=Count(
-            'attendancesession__records',
-            filter=Q(
-                attendancesession__records__student=student,
-                attendancesession__records__is_present=True,
-            ),
-            distinct=True,
-        ),
-    )
+    subjects = Subject.objects.filter(semester=student.semester)
+    summaries = {
+        row.subject_id: row
+        for row in AttendanceSummary.objects.filter(student=student, subject__in=subjects)
+    }
+    for sub in subjects:
+        summary = summaries.get(sub.id)
+        sub.total_sessions = summary.sessions_held if summary else 0
+        sub.present_sessions = summary.present if summary else 0
 
     total_classes = sum(sub.total_sessions for sub in subjects)
     present_count = sum(sub.present_sessions for sub in subjects)
@@ -70,17 +76,37 @@ def attendance_stats(request):
 
 @login_required
 @student_required
+@timed_view('register')
 def register_face_view(request):
     student = request.user.student_profile
     existing_face = FaceData.objects.filter(student=student).first()
 
     if request.method == 'POST':
-        form = FaceRegistrationForm(request.POST, request.FILES, instance=existing_face)
-        if form.is_valid():
+        timer = request.stage_timer
+        with timer.stage('validate'):
+            form = FaceRegistrationForm(request.POST, request.FILES, instance=existing_face)
+            is_valid = form.is_valid()
+        if is_valid and settings.FACE_REGISTRATION_ASYNC:
+            # Save the photo now and encode it in the background; the page polls for the result.
+            face_instance = form.save(commit=False)
+            face_instance.student = student
+            face_instance.status = 'PENDING'
+            face_instance.status_message = ''
+            with timer.stage('write'):
+                face_instance.save()
+            try:
+                with timer.stage('submit'):
+                    queue_face_encoding(face_instance)
+            except Exception as e:
+                # Still PENDING, so the status poll re-queues it once it goes stale.
+                logger.error(f"Could not queue face encoding for student {student.id}: {e}")
+            messages.info(request, "Photo uploaded. We're checking it now; this page will update when it's done.")
+            return redirect('register_face_view')
+        elif is_valid:
             try:
                 uploaded_image = request.FILES['face_image']
-                image = face_recognition.load_image_file(uploaded_image)
-                encodings = face_recognition.face_encodings(image)
+                encodings = run_encoder_timed(timer, encode_image_timed, uploaded_image.read(), pipeline_options())
+                uploaded_image.seek(0)
                 
                 if len(encodings) == 0:
                     messages.error(request, "No face detected. Try again.")
@@ -90,10 +116,15 @@ def register_face_view(request):
                     face_instance = form.save(commit=False)
                     face_instance.student = student
                     face_instance.set_encoding(encodings[0])
-                    face_instance.save()
+                    face_instance.status = 'READY'
+                    face_instance.status_message = ''
+                    with timer.stage('write'):
+                        face_instance.save()
                     messages.success(request, "Face ID registered successfully!")
                     return redirect('student_dashboard')
 
+            except (EncoderBusy, EncoderTimeout):
+                messages.error(request, "Face registration is busy right now. Please try again in a moment.")
             except Exception as e:
                 messages.error(request, f"Error: {str(e)}")
     else:
@@ -104,6 +135,20 @@ def register_face_view(request):
     })
 
 
+@login_required
+@student_required
+def face_registration_status(request):
+    face = FaceData.objects.filter(student=request.user.student_profile).first()
+    if face is None:
+        return JsonResponse({'status': 'none', 'message': 'No face registered.'})
+    requeue_if_stale(face)
+    return JsonResponse({
+        'status': face.status.lower(),
+        'message': face.status_message,
+        'has_encoding': face.encoding is not None,
+    })
+
+
 @login_required
 @student_required
 def student_dashboard(request):
@@ -120,8 +165,11 @@ def student_dashboard(request):
         else:
             asm.status = 'Pending'
 
-    total_sessions = AttendanceSession.objects.filter(subject__in=subjects).count()
-    present_count = AttendanceRecord.objects.filter(student=student, is_present=True).count()
+    totals = AttendanceSummary.objects.filter(student=student, subject__in=subjects).aggregate(
+        held=Sum('sessions_held'), present=Sum('present'),
+    )
+    total_sessions = totals['held'] or 0
+    present_count = totals['present'] or 0
     
     attendance_percentage = 0
     attendance_degrees = 0
@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from pathlib import Path
 
 from django.core.exceptions import ImproperlyConfigured
@@ -136,13 +137,90 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'smart-campus-cache',
-    }
-}
+# The cache must be visible to every gunicorn worker on the node, otherwise the
+# face gallery built in one worker is rebuilt by the next one. 'file' (default)
+# and 'db' are shared without an external service; 'locmem' is per-process and
+# only suitable for runserver or a single worker. See README "Caching".
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file').strip().lower()
 
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'smart-campus-cache',
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'smart_campus_cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000')),
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'smart-campus-cache')),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000')),
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured("CACHE_BACKEND must be one of 'file', 'db' or 'locmem'.")
+
+
+
+# Face detection/encoding runs in a process pool so it never holds a web worker's
+# CPU. Frames beyond workers + queue size are refused with a "busy, retry" reply.
+FACE_ENCODER_WORKERS = int(os.getenv('FACE_ENCODER_WORKERS', '2'))  # 0 = run inline
+FACE_ENCODER_QUEUE_SIZE = int(os.getenv('FACE_ENCODER_QUEUE_SIZE', '4'))
+FACE_ENCODER_TIMEOUT = float(os.getenv('FACE_ENCODER_TIMEOUT', '15'))
+
+# Detection runs on a copy downscaled to FACE_DETECT_MAX_DIM; encodings are taken
+# from an image decoded (JPEG draft mode) at up to FACE_ENCODE_MAX_DIM.
+FACE_DETECTION_MODEL = os.getenv('FACE_DETECTION_MODEL', 'hog')  # 'hog' or 'cnn'
+FACE_DETECTION_UPSAMPLE = int(os.getenv('FACE_DETECTION_UPSAMPLE', '1'))
+FACE_DETECT_MAX_DIM = int(os.getenv('FACE_DETECT_MAX_DIM', '640'))
+FACE_ENCODE_MAX_DIM = int(os.getenv('FACE_ENCODE_MAX_DIM', '1280'))
+
+# Frames whose 64-bit perceptual hash is within this many bits of the session's
+# last recognised frame reuse its result instead of running detection (-1 = off).
+FACE_FRAME_DEDUP_THRESHOLD = int(os.getenv('FACE_FRAME_DEDUP_THRESHOLD', '4'))
+FACE_FRAME_DEDUP_MAX_AGE = int(os.getenv('FACE_FRAME_DEDUP_MAX_AGE', '30'))  # seconds
+
+# Campus-wide approximate nearest-neighbour index (gates, library). Rebuild with
+# `python manage.py build_face_index`; registrations are appended incrementally.
+FACE_INDEX_DIR = os.getenv('FACE_INDEX_DIR', str(BASE_DIR / 'ml_models' / 'face_index'))
+FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', '8'))
+FACE_INDEX_COMPACT_AFTER = int(os.getenv('FACE_INDEX_COMPACT_AFTER', '2000'))  # log records before a new snapshot
+
+# Face registration saves the photo as PENDING and encodes it in a small background
+# pool; the page polls for the result. Pending rows older than STALE_AFTER seconds
+# are re-queued when polled (e.g. after a worker restart).
+FACE_REGISTRATION_ASYNC = env_bool('FACE_REGISTRATION_ASYNC', True)
+FACE_REGISTRATION_WORKERS = int(os.getenv('FACE_REGISTRATION_WORKERS', '1'))
+FACE_REGISTRATION_STALE_AFTER = int(os.getenv('FACE_REGISTRATION_STALE_AFTER', '120'))
+
+# Per-stage timings of recognition/registration are always collected (see
+# /attendance/metrics/timing/); this also returns them in an X-Recognition-Timing header.
+RECOGNITION_TIMING_HEADER = env_bool('RECOGNITION_TIMING_HEADER', DEBUG)
+
+# Where the ML pages get absence streaks: 'timeline' (packed bits on AttendanceSummary)
+# or 'sql' (window-function query over the attendance records). Timeline is the
+# default. In benchmark_attendance_streaks (100k records, SQLite) 'sql' took 0.24s,
+# twice the old per-record loop (0.12s), against 0.005s for the timelines, and it
+# has not been measured on MySQL. Use 'sql' only where records are changed outside
+# the app and the summaries may lag behind them.
+ATTENDANCE_STREAK_BACKEND = os.getenv('ATTENDANCE_STREAK_BACKEND', 'timeline')
+if ATTENDANCE_STREAK_BACKEND not in ('timeline', 'sql'):
+    raise ImproperlyConfigured("ATTENDANCE_STREAK_BACKEND must be 'timeline' or 'sql'.")
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -42,6 +42,9 @@ fi
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+echo "Creating cache table (only used when CACHE_BACKEND=db)..."
+python manage.py createcachetable
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
@@ -52,5 +55,7 @@ if [ $# -gt 0 ]; then
 else
     # Default fallback: run using gunicorn
     echo "Starting Gunicorn server..."
-    exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3
+    # Threads let a worker keep serving other requests while a frame is being
+    # encoded in the face encoder pool.
+    exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3 --threads 4
 fi